@@ -1,63 +1,658 @@
 import polars as pl
 import numpy as np
-from typing import List, Dict, Callable
-import time
+from typing import List, Dict, Callable, Hashable, Union
+import itertools
+from collections import OrderedDict
+import inspect
+import hashlib
+import json
 import os
-import plotly.express as px
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from multiprocessing import shared_memory
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime
 import plotly.io as pio
 pio.templates.default = "plotly_white"
-import talib as ta
 from strategies.macd import main
+import indicator_cache
+import charts
+from ledger import TradeLedger
+from telemetry import telemetry
 
 import optuna
 
+
+def _initial_state(rows: int, initial_capital: float) -> dict:
+    """Flat book with all cash, the starting state of _simulate_chunk"""
+    return {'capital': np.full(rows, float(initial_capital)), 'shares': np.zeros(rows),
+            'short_shares': np.zeros(rows), 'position': np.zeros(rows, dtype=np.int64)}
+
+
+def _simulate_chunk(signals: np.ndarray, open_prices: np.ndarray, close_prices: np.ndarray, state: dict,
+                    fills: bool = False) -> tuple:
+    """
+    Simulate a block of bars for every row of a signal matrix, starting from and returning the book state,
+    so consecutive blocks give the same result as one pass over all of them
+
+    Parameters:
+    signals: (rows, bars) matrix of 1/-1/0 signals, one row per parameter set
+    open_prices, close_prices: (bars,) price arrays shared by all rows
+    state: Book before the first bar, from _initial_state or a previous call
+    fills: Also return the trade mask and the (rows, trades + 1) capital/shares/short_shares after each trade,
+           slot 0 holding the book carried in
+
+    Returns:
+    (rows, bars) portfolio values at each close, trade counts per row, and the book after the last bar
+    """
+    rows, n = signals.shape
+    if n == 0:
+        empty = np.empty((rows, 0)), np.zeros(rows, dtype=np.int64), state
+        if fills:
+            book = {key: np.asarray(state[key], dtype=np.float64)[:, None] for key in ('capital', 'shares', 'short_shares')}
+            return empty + ({'is_trade': np.zeros((rows, 0), dtype=bool), **book},)
+        return empty
+    bar = np.arange(n)
+
+    # Position before each bar = last non-zero signal of that row, or the position carried in
+    last_nz = np.maximum.accumulate(np.where(signals != 0, bar, -1), axis=1)
+    prev_nz = np.concatenate((np.full((rows, 1), -1), last_nz[:, :-1]), axis=1)
+    prev_pos = np.where(prev_nz >= 0, np.take_along_axis(signals, np.maximum(prev_nz, 0), axis=1),
+                        state['position'][:, None])
+    is_trade = (signals != 0) & (signals != prev_pos)
+    counts = is_trade.sum(axis=1)
+    k_max = int(counts.max()) if rows else 0
+
+    # Trades packed left per row so the cash recursion steps over trade ordinals, not bars
+    r, c = np.nonzero(is_trade)
+    k = np.arange(len(r)) - np.repeat(np.cumsum(counts) - counts, counts)
+    trade_sig = np.zeros((rows, k_max), dtype=np.int64)
+    trade_open = np.ones((rows, k_max))
+    trade_close = np.ones((rows, k_max))
+    trade_sig[r, k] = signals[r, c]
+    trade_open[r, k] = open_prices[c]
+    trade_close[r, k] = close_prices[c]
+
+    cap_after = np.empty((rows, k_max + 1))
+    shares_after = np.empty((rows, k_max + 1))
+    short_after = np.empty((rows, k_max + 1))
+    capital, shares, short_shares = state['capital'], state['shares'], state['short_shares']
+    cap_after[:, 0], shares_after[:, 0], short_after[:, 0] = capital, shares, short_shares
+    for j in range(k_max):
+        s, o, cl = trade_sig[:, j], trade_open[:, j], trade_close[:, j]
+        buy = s == 1
+        close_long = (s == -1) & (shares > 0)
+        open_short = (s == -1) & ~(shares > 0)
+        new_shares = capital // o
+        capital = np.where(buy, capital - new_shares * o, capital)
+        capital = np.where(close_long, capital + shares * o, capital)
+        shares = np.where(buy, new_shares, np.where(close_long, 0.0, shares))
+        new_short = capital // cl
+        short_shares = np.where(open_short, new_short, short_shares)
+        capital = np.where(open_short, capital + new_short * cl, capital)
+        cap_after[:, j + 1], shares_after[:, j + 1], short_after[:, j + 1] = capital, shares, short_shares
+
+    held = np.cumsum(is_trade, axis=1)
+    equity = (np.take_along_axis(cap_after, held, axis=1)
+              + np.take_along_axis(shares_after, held, axis=1) * close_prices
+              - np.take_along_axis(short_after, held, axis=1) * close_prices)
+    position = np.where(last_nz[:, -1] >= 0, signals[np.arange(rows), np.maximum(last_nz[:, -1], 0)],
+                        state['position'])
+    state = {'capital': capital, 'shares': shares, 'short_shares': short_shares, 'position': position}
+    if fills:
+        return equity, counts, state, {'is_trade': is_trade, 'capital': cap_after, 'shares': shares_after,
+                                       'short_shares': short_after}
+    return equity, counts, state
+
+
+def _simulate_batch(signals: np.ndarray, open_prices: np.ndarray, close_prices: np.ndarray,
+                    initial_capital: float) -> tuple:
+    """
+    Simulate every row of a signal matrix in one pass with the same fills as Backtester._simulate_loop
+
+    Parameters:
+    signals: (rows, bars) matrix of 1/-1/0 signals, one row per parameter set
+    open_prices, close_prices: (bars,) price arrays shared by all rows
+    initial_capital: Starting cash for every row
+
+    Returns:
+    (rows, bars + 1) portfolio values including the starting value, and trade counts per row
+    """
+    rows = signals.shape[0]
+    equity, counts, _ = _simulate_chunk(signals, open_prices, close_prices, _initial_state(rows, initial_capital))
+    values = np.concatenate((np.full((rows, 1), float(initial_capital)), equity), axis=1)
+    return values, counts
+
+
+# Per-process state for optimizer workers, filled once by _init_trial_worker
+_WORKER = {}
+
+
+def _publish_columns(data: pl.DataFrame) -> tuple:
+    """
+    Copy the date and numeric OHLCV columns into one shared memory block
+
+    Returns:
+    The SharedMemory handle (caller unlinks it) and the metadata workers need to attach
+    """
+    columns = [c for c in ['open', 'high', 'low', 'close', 'volume'] if c in data.columns]
+    n = len(data)
+    shm = shared_memory.SharedMemory(create=True, size=max(8 * n * (len(columns) + 1), 1))
+    date, block = _attach_columns(shm, n, len(columns))
+    date[:] = data['date'].to_physical().to_numpy()
+    for row, col in enumerate(columns):
+        block[row] = data[col].to_numpy()
+    meta = {'n': n, 'columns': columns, 'date_dtype': data['date'].dtype}
+    return shm, meta
+
+
+def _attach_columns(shm: shared_memory.SharedMemory, n: int, width: int) -> tuple:
+    """Views over a published block: int64 physical dates followed by a (width, n) float64 matrix"""
+    date = np.ndarray((n,), dtype=np.int64, buffer=shm.buf)
+    block = np.ndarray((width, n), dtype=np.float64, buffer=shm.buf, offset=8 * n)
+    return date, block
+
+
+def _init_trial_worker(shm_name: str, meta: dict, strategy_file: str = None) -> None:
+    """Attach to the published price block and build this worker's Backtester and strategy once"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    date, block = _attach_columns(shm, meta['n'], len(meta['columns']))
+    data = pl.DataFrame([pl.Series('date', date).cast(meta['date_dtype'])]
+                        + [pl.Series(col, block[row]) for row, col in enumerate(meta['columns'])])
+    _WORKER['shm'] = shm
+    _WORKER['backtester'] = Backtester(data)
+    if strategy_file is not None:
+        from strategy_registry import StrategyRegistry
+        _WORKER['strategy'] = StrategyRegistry(os.path.dirname(strategy_file)).get(os.path.basename(strategy_file))
+
+
+def _run_slice(params: dict, start: int, end: int, state: dict) -> tuple:
+    """One time slice of a trial inside a worker process, the parent decides after each whether to go on"""
+    backtester = _WORKER['backtester']
+    # Signals of the trials this worker ran last, the next slice of a trial usually lands on the same worker
+    recent = _WORKER.setdefault('signals', OrderedDict())
+    key = _param_key(params)
+    if key not in recent:
+        recent[key] = _trial_signals(backtester, _WORKER['strategy'], params)
+        if len(recent) > 8:
+            recent.popitem(last=False)
+    return _slice_step(backtester, recent[key], start, end, state)
+
+
+def _init_universe_worker(store_root: str, strategy_dir: str, strategy_name: str) -> None:
+    """Open the memory-mapped store and compile the strategy once per worker"""
+    from datastore import MarketDataStore
+    from strategy_registry import StrategyRegistry
+    _WORKER['store'] = MarketDataStore(store_root).open()
+    _WORKER['strategy'] = StrategyRegistry(strategy_dir).get(strategy_name)
+
+
+def _run_symbol(symbol: str, start, end, engine: str) -> dict:
+    """Backtest one symbol inside a universe worker"""
+    row = {'Symbol': symbol}
+    try:
+        backtester = Backtester(_WORKER['store'].scan(symbol, start, end), symbol=symbol)
+        row.update(backtester.run(_WORKER['strategy'], engine=engine))
+    except Exception as e:
+        row['Error'] = f'{type(e).__name__}: {e}'
+    return row
+
+
+def backtest_universe(store_root: str, strategy_name: str, symbols: List[str], start=None, end=None,
+                      strategy_dir: str = 'strategies', engine: str = 'vector', n_jobs: int = -1,
+                      sort_by: str = 'Sharpe Ratio', progress: Callable[..., None] = None) -> pl.DataFrame:
+    """
+    Run one strategy over many symbols in parallel worker processes
+
+    Parameters:
+    store_root: MarketDataStore directory, workers memory-map it instead of receiving data
+    strategy_name: Strategy file inside strategy_dir
+    symbols: Symbols to scan
+    start, end: Optional inclusive date range
+    engine: Execution engine, see Backtester.apply_strategy
+    n_jobs: Worker processes, -1 uses every core
+    sort_by: Metric used to rank symbols
+    progress: Optional callback receiving symbols done and total
+
+    Returns:
+    One row of metrics per symbol, best first
+    """
+    workers = min(os.cpu_count() if n_jobs == -1 else max(1, n_jobs), max(1, len(symbols)))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                             initializer=_init_universe_worker,
+                             initargs=(store_root, strategy_dir, strategy_name)) as pool:
+        futures = [pool.submit(_run_symbol, symbol, start, end, engine) for symbol in symbols]
+        for future in as_completed(futures):
+            rows.append(future.result())
+            if progress is not None:
+                progress(phase='scanning', done=len(rows), total=len(symbols))
+    table = pl.DataFrame(rows, infer_schema_length=None)
+    if sort_by in table.columns:
+        table = table.sort(sort_by, descending=True, nulls_last=True)
+    return table
+
+
+def _default_warmup(strategy: Callable[..., List[int]], params: dict) -> int:
+    """20x the longest integer window among the strategy's defaults and params, recursive indicators
+    such as EMAs have forgotten their seed to within float rounding by then"""
+    windows = {name: p.default for name, p in inspect.signature(strategy).parameters.items()
+               if isinstance(p.default, int) and not isinstance(p.default, bool)}
+    windows.update({k: v for k, v in params.items() if isinstance(v, int) and not isinstance(v, bool)})
+    return 20 * max(windows.values(), default=0)
+
+
+def _chunks(source: pl.LazyFrame, chunk_size: int):
+    """Frames of about chunk_size rows read from source one at a time"""
+    if hasattr(source, 'collect_batches'):
+        yield from source.collect_batches(chunk_size=chunk_size)
+        return
+    offset = 0
+    while True:
+        chunk = source.slice(offset, chunk_size).collect()
+        if not len(chunk):
+            return
+        yield chunk
+        offset += len(chunk)
+
+
+def backtest_chunked(source: Union[pl.LazyFrame, pl.DataFrame], strategy: Callable[..., List[int]],
+                     chunk_size: int = 1_000_000, warmup: int = None, initial_capital: float = 100000.0,
+                     progress: Callable[..., None] = None, symbol: str = None, sort: bool = True,
+                     **params) -> Dict:
+    """
+    Backtest bars streamed from disk in chunks, for histories that do not fit in memory
+
+    Each chunk's signals come from the strategy run on the last warmup bars before it plus the chunk, and
+    the book (cash, shares, position) is carried from chunk to chunk by _simulate_chunk. Returns, Sharpe
+    and drawdown are accumulated as the chunks pass, so only one chunk and its warm-up are held at a time.
+    The metrics equal Backtester.run on the whole frame when warmup covers the strategy's lookback, which is
+    exact for rolling windows and within float rounding for EMAs at the default.
+
+    Parameters:
+    source: Bars of one symbol, e.g. MarketDataStore.scan(), pl.scan_parquet() or pl.scan_csv('stockdata.csv').
+            A 'date' column is used as is, otherwise the frame goes through datastore.normalize. A ValueError
+            is raised if several symbols appear
+    strategy: Function returning position signals for a frame
+    chunk_size: Bars read per chunk
+    warmup: Bars of history prepended to each chunk, see _default_warmup when None
+    initial_capital: Starting portfolio value
+    progress: Optional callback receiving the bars done so far
+    symbol: Keep only this symbol's bars, for sources holding several symbols
+    sort: Sort the bars by date before streaming, which holds the whole history for the sort. Pass False
+          for sources already in date order, such as MarketDataStore.scan(), a ValueError is then raised
+          if they are not
+    params: Passed through to the strategy
+
+    Returns:
+    Dictionary of performance metrics, the keys of Backtester.metrics
+    """
+    source = source.lazy()
+    if 'date' not in source.collect_schema():
+        from datastore import normalize
+        source = normalize(source)
+    if symbol is not None:
+        source = source.filter(pl.col('symbol') == symbol)
+    if sort:
+        source = source.sort(['symbol', 'date'] if 'symbol' in source.collect_schema() else 'date', maintain_order=True)
+    if warmup is None:
+        warmup = _default_warmup(strategy, params)
+    book = _initial_state(1, initial_capital)
+    tail = None
+    bars = trades = 0
+    # Running count, mean and sum of squared deviations of bar returns (Chan et al. merge), and drawdown state
+    n_ret, mean, m2 = 0, 0.0, 0.0
+    last_value = peak = float(initial_capital)
+    drawdown = 0.0
+    first_close = last_close = None
+    seen_symbol = None
+    chunks = _chunks(source, chunk_size)
+    while True:
+        with telemetry.timer('load'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        if not len(chunk):
+            continue
+        if 'symbol' in chunk.columns:
+            names = chunk['symbol'].unique(maintain_order=True).to_list()
+            seen_symbol = seen_symbol or names[0]
+            if len(names) > 1 or names[0] != seen_symbol:
+                raise ValueError(f"backtest_chunked got bars of several symbols ({seen_symbol}, "
+                                 f"{next(name for name in names if name != seen_symbol)}), pass symbol= to pick one")
+        if not chunk['date'].is_sorted() or (tail is not None and len(tail) and chunk['date'][0] < tail['date'][-1]):
+            raise ValueError('backtest_chunked needs bars sorted by date')
+        window = chunk if tail is None else pl.concat([tail, chunk], how='vertical_relaxed')
+        with telemetry.timer('signals'):
+            signals = np.asarray(strategy(window, **params), dtype=np.int64)[len(window) - len(chunk):]
+        close = chunk['close'].to_numpy().astype(np.float64)
+        with telemetry.timer('simulate', engine='chunked'):
+            equity, counts, book = _simulate_chunk(signals[None, :], chunk['open'].to_numpy().astype(np.float64),
+                                                   close, book)
+        values = equity[0]
+        returns = values / np.concatenate(([last_value], values[:-1])) - 1
+        k, k_mean = len(returns), returns.mean()
+        delta = k_mean - mean
+        m2 += ((returns - k_mean) ** 2).sum() + delta ** 2 * n_ret * k / (n_ret + k)
+        mean += delta * k / (n_ret + k)
+        n_ret += k
+        running_peak = np.maximum(np.maximum.accumulate(values), peak)
+        drawdown = min(drawdown, float(((values / running_peak - 1) * 100).min()))
+        peak, last_value = float(running_peak[-1]), float(values[-1])
+        trades += int(counts[0])
+        if first_close is None:
+            first_close = close[0]
+        last_close = close[-1]
+        bars += len(chunk)
+        tail = window.tail(warmup) if warmup else chunk.clear()
+        if progress is not None:
+            progress(phase='streaming', done=bars)
+    if not bars:
+        raise ValueError('backtest_chunked got no bars')
+    return {
+        'Total Return': (last_value / initial_capital - 1) * 100,
+        'Annual Return': ((last_value / initial_capital) ** (252 / bars) - 1) * 100,
+        'Sharpe Ratio': float(np.sqrt(252) * mean / np.sqrt(m2 / (n_ret - 1))) if n_ret > 1 else float('nan'),
+        'Max Drawdown': drawdown,
+        'Num Trades': trades,
+        'Buy&Hold Return': float((last_close / first_close - 1) * 100),
+    }
+
+
+# Used for strategies that do not declare PARAMS
+DEFAULT_SPACE = {'short_window': (10, 50), 'long_window': (50, 200)}
+
+# Optuna studies persist here so optimizations can be resumed or extended, None keeps them in memory
+STUDY_STORAGE = os.environ.get('OPTUNA_STORAGE', 'sqlite:///optuna.db')
+
+
+def search_space(strategy: Callable[..., List[int]]) -> Dict:
+    """
+    Parameter space declared by the strategy's module as PARAMS, DEFAULT_SPACE when it has none
+
+    PARAMS maps each main() keyword to (low, high) or (low, high, step) for int/float ranges, or to a
+    list of choices, e.g. PARAMS = {'short_window': (5, 50), 'long_window': (20, 200, 5), 'ma': ['sma', 'ema']}
+    """
+    return getattr(strategy, '__globals__', {}).get('PARAMS', DEFAULT_SPACE)
+
+
+def _suggest_params(trial: optuna.trial.BaseTrial, space: Dict) -> dict:
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            params[name] = trial.suggest_categorical(name, spec)
+        elif all(isinstance(v, int) for v in spec):
+            params[name] = trial.suggest_int(name, spec[0], spec[1], step=spec[2] if len(spec) > 2 else 1)
+        else:
+            params[name] = trial.suggest_float(name, spec[0], spec[1], step=spec[2] if len(spec) > 2 else None)
+    return params
+
+
+def _param_key(params: dict) -> tuple:
+    return tuple(sorted(params.items()))
+
+
+def _slice_bounds(start: int, end: int, n_slices: int) -> List[int]:
+    return sorted(set(np.linspace(start, end, n_slices + 1).astype(int).tolist()))
+
+
+def _trial_signals(backtester: 'Backtester', strategy: Callable[..., List[int]], params: dict) -> np.ndarray:
+    """Full-series signals of one parameter set, through the indicator cache shared by trials and folds"""
+    n = len(backtester.data)
+    return np.asarray(backtester._signals(strategy, **params)[:n], dtype=np.int64)
+
+
+def _slice_step(backtester: 'Backtester', signals: np.ndarray, start: int, end: int, state: dict = None) -> tuple:
+    """Simulate bars start..end of signals from state, returns (total return % at end, state after it)"""
+    capital = backtester.initial_capital
+    if state is None:
+        state = _initial_state(1, capital)
+    chunk = backtester.data.slice(start, end - start)
+    equity, _, state = _simulate_chunk(signals[None, start:end], chunk['open'].to_numpy().astype(np.float64),
+                                       chunk['close'].to_numpy().astype(np.float64), state)
+    return float((equity[0, -1] / capital - 1) * 100), state
+
+
+def _slice_returns(backtester: 'Backtester', strategy: Callable[..., List[int]], params: dict, bounds: List[int]):
+    """
+    Yield the total return (%) at the end of each time slice between consecutive bounds
+
+    Signals come from the full series through the indicator cache, so indicators are warm at bounds[0]
+    and a window another trial or fold already computed is a lookup. The simulation carries its book
+    from slice to slice, so a consumer that stops early skips the rest of it; the strategy call itself
+    is not split, a pruned trial has paid for its indicators.
+    """
+    signals = _trial_signals(backtester, strategy, params)
+    state = None
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        value, state = _slice_step(backtester, signals, a, b, state)
+        yield value
+
+
+def _objective(backtester: 'Backtester', strategy: Callable[..., List[int]], space: Dict, bounds: List[int],
+               memo: Dict[tuple, float]) -> Callable:
+    """
+    Optuna objective reporting the running return after every time slice so the pruner can stop bad
+    trials early. Parameter sets already evaluated are answered from memo (None marks a pruned set).
+    """
+    def objective(trial):
+        params = _suggest_params(trial, space)
+        key = _param_key(params)
+        if key in memo:
+            if memo[key] is None:
+                raise optuna.TrialPruned()
+            return memo[key]
+        value = None
+        for step, value in enumerate(_slice_returns(backtester, strategy, params, bounds)):
+            trial.report(value, step)
+            if trial.should_prune():
+                memo[key] = None
+                raise optuna.TrialPruned()
+        memo[key] = value
+        return value
+    return objective
+
+
+def _memo_from(study: optuna.study.Study) -> Dict[tuple, float]:
+    """Results of trials a persisted study already ran"""
+    memo = {}
+    for t in study.trials:
+        if t.state == optuna.trial.TrialState.COMPLETE:
+            memo[_param_key(t.params)] = t.value
+        elif t.state == optuna.trial.TrialState.PRUNED:
+            memo[_param_key(t.params)] = None
+    return memo
+
+
+def _new_study(storage: str = None, study_name: str = None, seed: int = None) -> optuna.study.Study:
+    return optuna.create_study(direction='maximize', storage=storage, study_name=study_name, load_if_exists=True,
+                               sampler=optuna.samplers.TPESampler(seed=seed),
+                               pruner=optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1))
+
+
+def walk_forward_folds(n: int, train_bars: int, test_bars: int, anchored: bool = False) -> List[tuple]:
+    """
+    Train/test bar ranges for walk-forward evaluation
+
+    Parameters:
+    n: Bars in the series
+    train_bars: Bars in each training window (the first one when anchored)
+    test_bars: Bars in each test window, test windows follow each other without overlap
+    anchored: Training windows all start at bar 0 and grow, otherwise they roll forward
+
+    Returns:
+    List of (train_start, train_end, test_start, test_end) half-open ranges
+    """
+    folds = []
+    for test_start in range(train_bars, n, test_bars):
+        train_start = 0 if anchored else test_start - train_bars
+        folds.append((train_start, test_start, test_start, min(test_start + test_bars, n)))
+    return folds
+
+
+def _optimize_fold(backtester: 'Backtester', strategy: Callable[..., List[int]], train_start: int, train_end: int,
+                   n_trials: int, seed: int = None, n_slices: int = 4) -> tuple:
+    """
+    Optuna search over one training window
+
+    Signals are computed on the full series and sliced, so indicators are warm at the window start and a
+    parameter set seen by another fold is served from the indicator cache.
+    """
+    study = _new_study(seed=seed)
+    study.optimize(_objective(backtester, strategy, search_space(strategy), _slice_bounds(train_start, train_end, n_slices),
+                              {}), n_trials=n_trials)
+    return study.best_params, study.best_value
+
+
+def _init_fold_worker(shm_name: str, meta: dict, strategy_dir: str, strategy_name: str, symbol: str,
+                      data_version: Hashable) -> None:
+    """Attach to the published prices and compile the strategy once per walk-forward worker"""
+    from strategy_registry import StrategyRegistry
+    _init_trial_worker(shm_name, meta)
+    backtester = _WORKER['backtester']
+    backtester.symbol, backtester.data_version = symbol, data_version
+    _WORKER['strategy'] = StrategyRegistry(strategy_dir).get(strategy_name)
+
+
+def _run_fold(train_start: int, train_end: int, n_trials: int, seed: int = None) -> tuple:
+    """Optimize one fold inside a walk-forward worker"""
+    return _optimize_fold(_WORKER['backtester'], _WORKER['strategy'], train_start, train_end, n_trials, seed)
+
+
+def _report_trials(study: optuna.study.Study, progress: Callable[..., None], offset: int = 0) -> None:
+    """
+    Send trials finished and best value so far (studies here maximize) to a progress callback
+
+    Parameters:
+    offset: Trials the study had before this run, e.g. when resuming a persisted study
+    """
+    finished = [t for t in study.trials if t.state.is_finished()]
+    best = max((t.value for t in finished if t.state == optuna.trial.TrialState.COMPLETE), default=None)
+    progress(trials=len(finished) - offset, best_value=best)
+
+
 class Backtester:
-    def __init__(self, data: pl.DataFrame, initial_capital: float = 100000.0):
+    def __init__(self, data: Union[pl.DataFrame, pl.LazyFrame], initial_capital: float = 100000.0, symbol: str = None,
+                 data_version: Hashable = None):
         """
         Initialize backtester with historical price data and starting capital
         
         Parameters:
-        data: Polars DataFrame with columns ['date', 'open', 'high', 'low', 'close', 'volume']
+        data: Polars DataFrame with columns ['date', 'open', 'high', 'low', 'close', 'volume'],
+              a LazyFrame is collected here so its filters and column selection reach the file scan
         initial_capital: Starting portfolio value
+        symbol: Symbol of the data, taken from its 'symbol' column when not given
+        data_version: Version of the data for indicator caching and study names, e.g. a store version and date
+                      range, fingerprinted from the data when not given
         """
-        self.data = data.sort('date')
+        if isinstance(data, pl.LazyFrame):
+            with telemetry.timer('load'):
+                data = data.sort('date').collect()
+        # One chunk per column, so strategies' indicator inputs can be recognised by the cache
+        self.data = data.sort('date').rechunk()
         self.initial_capital = initial_capital
         self.positions = 0
         self.capital = initial_capital
         self.portfolio_values = []
-        self.trades = []
+        self.trades = TradeLedger()
+        if symbol is None and 'symbol' in data.columns and len(data):
+            symbol = data['symbol'][0]
+        self.symbol = symbol
+        self.data_version = data_version
 
-    def apply_strategy(self, strategy: Callable[[pl.DataFrame, int, int], List[int]], optimize: bool = False) -> Dict:
+    def _signals(self, strategy: Callable[..., List[int]], **params) -> List[int]:
+        """Call strategy on self.data with indicator caching bound to this symbol and data version"""
+        if self.data_version is None:
+            self.data_version = indicator_cache.data_version(self.data)
+        with telemetry.timer('signals'), indicator_cache.bind(self.data, self.symbol, self.data_version):
+            return strategy(self.data, **params)
+
+    def apply_strategy(self, strategy: Callable[[pl.DataFrame, int, int], List[int]], optimize: bool = False,
+                       engine: str = 'loop', optimizer: str = 'thread', progress: Callable[..., None] = None,
+                       figure: bool = True) -> Dict:
         """
         Run backtest using provided strategy function, with optional optimization
+
+        Parameters:
+        strategy: Function returning a list of position signals (1 buy, -1 sell, 0 hold)
+        optimize: Run Optuna search for short/long windows before the backtest
+        engine: 'loop' walks bar by bar, 'vector' simulates with NumPy array operations
+        optimizer: 'thread' or 'process', see optimize_strategy
+        progress: Optional callback receiving keyword progress updates (phase, trials, best_value)
+        figure: Render the figure HTML, when False None is returned in its place and figure_json() or
+                snapshot() can draw it later
         """
         best_params=''
         if optimize:
-            best_params = self.optimize_strategy()
-            signals = strategy(self.data, short_window=best_params['short_window'], long_window=best_params['long_window'])
+            with telemetry.timer('optimize', mode=optimizer):
+                best_params = self.optimize_strategy(strategy, mode=optimizer, progress=progress)
+            signals = self._signals(strategy, **best_params)
         else:
-            signals = strategy(self.data)
+            signals = self._signals(strategy)
+        if progress is not None:
+            progress(phase='simulating')
+
+        self.simulate(signals, engine)
+        metrics = self.metrics()
+        metrics = {'Total Return': metrics['Total Return'],
+                   'Total Return test': float(self.trades.total_profit / self.initial_capital * 100),
+                   **metrics, 'Best Params': best_params}
+        return metrics, self.visualize_results() if figure else None
+
+    def run(self, strategy: Callable[..., List[int]], engine: str = 'vector', **params) -> Dict:
+        """
+        Backtest without building figures or the trade table, for scans over many symbols
+
+        Parameters:
+        strategy: Function returning position signals
+        engine: 'loop' or 'vector', see apply_strategy
+        params: Passed through to the strategy
 
-        # Reset tracking variables
+        Returns:
+        Dictionary of performance metrics
+        """
+        self.simulate(self._signals(strategy, **params), engine)
+        return self.metrics()
+
+    def simulate(self, signals: List[int], engine: str = 'vector') -> None:
+        """Reset the book and simulate signals, filling portfolio_values and trades"""
         self.capital = self.initial_capital
         self.positions = 0
         self.shares = 0
         self.short_shares = 0
         self.portfolio_values = [self.initial_capital]
-        self.trades = []
-        self.equity = []
+        self.trades = TradeLedger()
+        with telemetry.timer('simulate', engine=engine):
+            if engine == 'vector':
+                self._simulate_vectorized(signals)
+            elif engine == 'loop':
+                self._simulate_loop(signals, self.data['close'].to_list(), self.data['open'].to_list())
+            else:
+                raise ValueError(f"Unknown engine '{engine}', expected 'loop' or 'vector'")
 
-        close_prices = self.data['close'].to_list()
-        open_prices = self.data['open'].to_list()
-        
+    def metrics(self) -> Dict:
+        """Performance metrics of the last simulation"""
+        with telemetry.timer('metrics'):
+            values = np.asarray(self.portfolio_values, dtype=np.float64)
+            returns = values[1:] / values[:-1] - 1
+            close = self.data['close']
+            return {
+                'Total Return': float((values[-1] / self.initial_capital - 1) * 100),
+                'Annual Return': float(((values[-1] / self.initial_capital) ** (252 / len(self.data)) - 1) * 100),
+                'Sharpe Ratio': float(np.sqrt(252) * returns.mean() / returns.std(ddof=1)),
+                'Max Drawdown': float(((values / np.maximum.accumulate(values) - 1) * 100).min()),
+                'Num Trades': len(self.trades),
+                'Buy&Hold Return': (close[-1] / close[0] - 1) * 100,
+            }
+
+    def _simulate_loop(self, signals: List[int], close_prices: List[float], open_prices: List[float]) -> None:
+        """
+        Reference execution engine: walks every bar and books trades one at a time
+        """
         # Iterate through data points
         for i in range(0, len(self.data)):
             # Get current price data
             current_price = close_prices[i]
-            prev_price = close_prices[i-1]
             open_price = open_prices[i]
 
             # Check for trade signal
@@ -77,34 +672,16 @@ class Backtester:
                         #proceeds = self.shares * current_price
                         proceeds = self.shares * open_price
                         self.capital += proceeds
-                        print(proceeds, current_price, open_price)
                         self.shares = 0
                     else:
                         # Initiate short position
                         self.short_shares = self.capital // current_price
                         proceeds = self.short_shares * current_price
                         self.capital += proceeds
-                #print(self.capital)
                     
                 # Record trade
-                self.trades.append({
-                    'date': self.data['date'][i],
-                    'type': 'buy' if signals[i] == 1 else 'sell',
-                    'price': open_price,
-                    'shares': self.shares if signals[i] == 1 else self.short_shares,
-                    'capital': self.capital,
-                    'profit_loss': 0,
-                    'cum_profit': 0
-                })
-                if len(self.trades) > 1:
-                    prev_trade = self.trades[-2]
-                    if prev_trade['type'] == 'buy' and signals[i] == -1:
-                        self.trades[-1]['profit_loss'] = (open_price - prev_trade['price']) * prev_trade['shares']
-                        self.trades[-1]['cum_profit'] = sum([i['profit_loss'] for i in self.trades])
-                    elif prev_trade['type'] == 'sell' and signals[i] == 1:
-                        self.trades[-1]['profit_loss'] = (prev_trade['price'] - open_price) * prev_trade['shares']
-                        #sself.equity.append(self.capital+self.trades[i]['profit_loss'])
-                        self.trades[-1]['cum_profit'] = sum([i['profit_loss'] for i in self.trades])
+                self.trades.record(i, signals[i], open_price, self.shares if signals[i] == 1 else self.short_shares,
+                                   self.capital)
                 # Update positions
                 self.positions = signals[i]
 
@@ -113,40 +690,38 @@ class Backtester:
             short_value = self.short_shares * current_price
             portfolio_value = self.capital + stock_value - short_value
             self.portfolio_values.append(portfolio_value)
-        print(self.equity)
-        # Calculate performance metrics using Polars
-        portfolio_series = pl.Series("value", self.portfolio_values)
-        returns = portfolio_series.pct_change()
-
-        # Calculate total profit/loss from trades
-        total_profit_loss = sum(trade['profit_loss'] for trade in self.trades)
-        trdf=pl.DataFrame(self.trades)
-        print(trdf.to_pandas().to_string())
-        self.data=self.data.join(trdf,on='date',how='left')
-        print(self.data['profit_loss'].sum())
-        # Calculate total return based on profit/loss
-        total_return = (total_profit_loss / self.initial_capital) * 100
-        #total_return = (equity[-1]-equity[0])/equity[0]*100
-        # Calculate performance metrics using Polars
-        portfolio_series = pl.Series("value", self.portfolio_values)
-        returns = portfolio_series.pct_change()
 
-        # Calculate buy and hold returns
-        buy_and_hold_return = (close_prices[-1] / close_prices[0] - 1) * 100
+    def _simulate_vectorized(self, signals: List[int]) -> None:
+        """
+        Array execution engine, gives the same portfolio values and trades as _simulate_loop.
 
-        metrics = {
-            'Total Return': (self.portfolio_values[-1] / self.initial_capital - 1) * 100,
-            'Total Return test': total_return,
-            'Annual Return': ((self.portfolio_values[-1] / self.initial_capital) **
-                            (252 / len(self.data)) - 1) * 100,
-            'Sharpe Ratio': np.sqrt(252) * returns.mean() / returns.std(),
-            'Max Drawdown': self._calculate_max_drawdown(),
-            'Num Trades': len(self.trades),
-            'Buy&Hold Return': buy_and_hold_return,
-            'Best Params': best_params
-        }
+        Runs the book as a one-row _simulate_chunk and books its fills into the trade ledger.
+        """
+        n = len(self.data)
+        close = self.data['close'].to_numpy().astype(np.float64)
+        opn = self.data['open'].to_numpy().astype(np.float64)
+        sig = np.asarray(signals[:n], dtype=np.int64)
+
+        equity, _, state, book = _simulate_chunk(sig[None, :], opn, close, _initial_state(1, self.initial_capital),
+                                                 fills=True)
+        trade_idx = np.flatnonzero(book['is_trade'][0])
+        m = len(trade_idx)
+        cap_after, shares_after, short_after = book['capital'][0], book['shares'][0], book['short_shares'][0]
+
+        # Trades alternate buy/sell, so each P&L pairs with the previous fill
+        is_buy = sig[trade_idx] == 1
+        trade_shares = np.where(is_buy, shares_after[1:], short_after[1:])
+        price = opn[trade_idx]
+        profit_loss = np.zeros(m)
+        if m > 1:
+            move = price[1:] - price[:-1]
+            profit_loss[1:] = np.where(is_buy[1:], -move, move) * trade_shares[:-1]
 
-        return metrics, self.visualize_results()
+        self.capital, self.shares, self.short_shares = (float(state['capital'][0]), float(state['shares'][0]),
+                                                        float(state['short_shares'][0]))
+        self.positions = int(state['position'][0])
+        self.portfolio_values = np.concatenate(([self.initial_capital], equity[0]))
+        self.trades.extend(trade_idx, sig[trade_idx], price, trade_shares, cap_after[1:], profit_loss)
 
     #def _run_strategy(self, data: pl.DataFrame, strategy: Callable[[pl.DataFrame, int, int], List[int]], short_window: int, long_window: int) -> List[int]:
     #    return strategy(data, short_window, long_window)
@@ -157,7 +732,30 @@ class Backtester:
         rolling_max = portfolio_series.cum_max()
         drawdowns = (portfolio_series / rolling_max - 1) * 100
         return drawdowns.min()
-    def visualize_results(self) -> None:
+    def snapshot(self) -> Dict:
+        """What build_figure needs from a finished run, small enough to cache per run id"""
+        return {'data': self.data.select(['date', 'close']), 'initial_capital': self.initial_capital,
+                'portfolio_values': np.asarray(self.portfolio_values, dtype=np.float64), 'trades': self.trades}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> 'Backtester':
+        """Rebuild a finished run from snapshot() so its figure can be drawn later"""
+        backtester = cls(snapshot['data'], snapshot['initial_capital'])
+        backtester.portfolio_values = snapshot['portfolio_values']
+        backtester.trades = snapshot['trades']
+        return backtester
+
+    def visualize_results(self) -> str:
+        """Figure as an HTML fragment, plotly.js is expected on the page"""
+        with telemetry.timer('figure'):
+            return self.build_figure().to_html(full_html=False, include_plotlyjs=False)
+
+    def figure_json(self) -> str:
+        """Figure as Plotly JSON for Plotly.newPlot with the bundled static/plotly.min.js"""
+        with telemetry.timer('figure'):
+            return self.build_figure().to_json()
+
+    def build_figure(self) -> go.Figure:
         """
         Create interactive visualizations of backtest results using Plotly
         """
@@ -166,26 +764,26 @@ class Backtester:
                         subplot_titles=('Price and Portfolio Value','Strategy Returns','Trading Signals','Trade Types','Monthly Returns','Cumulative Returns'),
                          specs=[[{"secondary_y": True},{"secondary_y": False}],[{"secondary_y": False},{"secondary_y": False}],[{"secondary_y": False},{"secondary_y": False}]])
 
-        # Plot 1: Price and Portfolio Value
-        dates = self.data['date'].to_list()
+        # Plot 1: Price and Portfolio Value, long series are downsampled and drawn with WebGL
+        dates = self.data['date']
+        # portfolio_values[0] is the starting capital, value i + 1 is the close of bar i
+        values = np.asarray(self.portfolio_values, dtype=np.float64)
         # Add price line
-        fig.add_trace(go.Scatter(x=dates, y=self.data['close'].to_list(),name='Stock Price',line=dict(color='blue')),row=1, col=1)
+        fig.add_trace(charts.line(dates, self.data['close'].to_numpy(), name='Stock Price', line=dict(color='blue')), row=1, col=1)
         # Add portfolio value line
-        fig.add_trace(go.Scatter(x=dates, y=self.portfolio_values, name='Portfolio Value',line=dict(color='green')),secondary_y=True,row=1, col=1)
+        fig.add_trace(charts.line(dates, values[1:], name='Portfolio Value', line=dict(color='green')), secondary_y=True, row=1, col=1)
         # Plot 2: Returns
-        portfolio_returns = pl.Series(self.portfolio_values).pct_change().to_list()
-        fig.add_trace(go.Scatter(x=dates, y=portfolio_returns, name='Returns',fill='tozeroy',line=dict(color='purple')),row=2, col=1)
-        # Plot 3: Trading Signals
-        for trade in self.trades:
-            color = 'green' if trade['type'] == 'buy' else 'red'
-            symbol = 'triangle-up' if trade['type'] == 'buy' else 'triangle-down'
-            fig.add_trace(go.Scatter(x=[trade['date']],y=[trade['price']],mode='markers',name=trade['type'].capitalize(),
-                          marker=dict(symbol=symbol,color=color,size=15),showlegend=False),row=1, col=1)
+        portfolio_returns = values[1:] / values[:-1] - 1
+        fig.add_trace(charts.line(dates, portfolio_returns, name='Returns', fill='tozeroy', line=dict(color='purple')), row=2, col=1)
+        # Plot 3: Trading Signals, one trace per side
+        trades = self.trades.to_frame(dates)
+        for side, symbol, color in [('buy', 'triangle-up', 'green'), ('sell', 'triangle-down', 'red')]:
+            side_trades = trades.filter(pl.col('type') == side)
+            fig.add_trace(charts.markers(side_trades['date'], side_trades['price'].to_numpy(), side.capitalize(), symbol, color,
+                                         showlegend=False), row=1, col=1)
         # Add drawdown
-        portfolio_series = pl.Series("value", self.portfolio_values)
-        rolling_max = portfolio_series.cum_max()
-        drawdown = (portfolio_series / rolling_max - 1) * 100
-        fig.add_trace(go.Scatter(x=dates,y=drawdown.to_list(),name='Drawdown',fill='tozeroy',line=dict(color='red')),row=3, col=1)
+        drawdown = (values[1:] / np.maximum.accumulate(values)[1:] - 1) * 100
+        fig.add_trace(charts.line(dates, drawdown, name='Drawdown', fill='tozeroy', line=dict(color='red')), row=3, col=1)
         t1,t2,t3=self.generate_trade_analysis()
         fig.add_trace(t1,row=1,col=2)
         fig.add_trace(t2,row=2,col=2)
@@ -197,32 +795,27 @@ class Backtester:
         fig.update_yaxes(title_text="Price", row=1, col=1)
         fig.update_yaxes(title_text="Returns %", row=2, col=1)
         fig.update_yaxes(title_text="Drawdown %", row=3, col=1)
-        return fig.to_html(full_html=False)
+        return fig
 
     def generate_trade_analysis(self) -> go.Figure:
         """
         Generate detailed trade analysis visualization
         """
         # Calculate trade metrics
-        win_trades = [t for t in self.trades if t['type'] == 'buy']
-        loss_trades = [t for t in self.trades if t['type'] == 'sell']
+        counts = self.trades.counts()
         # Create figure
         #fig = make_subplots(rows=3, cols=1, subplot_titles=('Trade Distribution', 'Trade Timing','Monthly Returns','Cumulative Returns'))
         # Plot 1: Trade Distribution
         #fig.add_trace(go.Bar(x=['Buy', 'Sell'],y=[len(win_trades), len(loss_trades)], name='Trade Types'),row=1, col=1)
-        t1=go.Bar(x=['Buy', 'Sell'],y=[len(win_trades), len(loss_trades)], name='Trade Types')
+        t1=go.Bar(x=['Buy', 'Sell'],y=[counts['buy'], counts['sell']], name='Trade Types')
         # Plot 3: Monthly Returns
-        returns = pl.Series(self.portfolio_values).pct_change()
-        monthly_returns = pl.Series(self.portfolio_values).pct_change().to_list()
+        values = np.asarray(self.portfolio_values, dtype=np.float64)
+        returns = values[1:] / values[:-1] - 1
         #fig.add_trace(go.Box(y=monthly_returns,name='Monthly Returns'), row=2, col=1)
-        t2=go.Box(y=monthly_returns,name='Monthly Returns')
+        t2=charts.box(returns, name='Monthly Returns')
         # Plot 4: Cumulative Returns
-        #cumulative_returns = np.cumprod(1 + pl.Series(self.portfolio_values).pct_change().to_list()) - 1
-        returns_array = np.array([x for x in returns.to_list() if x is not None])  # Remove None values
-        cumulative_returns = np.cumprod(1 + returns_array) - 1
-        dates = self.data['date'].to_list()[1:] 
-        #fig.add_trace(go.Scatter(x=self.data['date'].to_list(),y=cumulative_returns,name='Cumulative Returns',fill='tozeroy'),row=3, col=1)
-        t3=go.Scatter(x=self.data['date'].to_list(),y=cumulative_returns,name='Cumulative Returns',fill='tozeroy')
+        cumulative_returns = values[1:] / values[0] - 1
+        t3=charts.line(self.data['date'], cumulative_returns, name='Cumulative Returns', fill='tozeroy')
         # Update layout
         #fig.update_layout(height=800,title_text="Detailed Trade Analysis",showlegend=False)
         return t1,t2,t3
@@ -239,7 +832,7 @@ class Backtester:
         Total return
         """
         data=self.data
-        signals = main(data, short_window, long_window)
+        signals = self._signals(main, short_window=short_window, long_window=long_window)
         
         # Calculate total return
         initial_capital = 100000.0
@@ -268,27 +861,283 @@ class Backtester:
         total_return = (portfolio_value / initial_capital - 1) * 100
         return total_return
 
-    def optimize_strategy(self, n_trials: int = 30) -> dict:
+    def simulate_grid(self, signals: np.ndarray, params: List[Dict], chunk_size: int = 256) -> pl.DataFrame:
         """
-        Optimizes the simple moving average strategy using Optuna.
+        Simulate a matrix of signals, one row per parameter set, without a Python loop over bars
 
         Parameters:
-        data: Price data DataFrame
-        n_trials: Number of optimization trials
+        signals: (len(params), len(data)) matrix of position signals
+        params: Parameter dict for each row, used as key columns of the result
+        chunk_size: Rows simulated together, bounds memory at chunk_size x bars floats
+
+        Returns:
+        Metrics table with one row per parameter set
+        """
+        signals = np.asarray(signals)
+        n = len(self.data)
+        if signals.ndim != 2 or signals.shape[0] != len(params):
+            raise ValueError("signals must be a 2D matrix with one row per parameter set")
+        signals = signals[:, :n]
+        close = self.data['close'].to_numpy().astype(np.float64)
+        opn = self.data['open'].to_numpy().astype(np.float64)
+
+        metrics = []
+        for start in range(0, len(params), chunk_size):
+            values, counts = _simulate_batch(signals[start:start + chunk_size].astype(np.int64), opn, close, self.initial_capital)
+            returns = values[:, 1:] / values[:, :-1] - 1
+            drawdowns = (values / np.maximum.accumulate(values, axis=1) - 1) * 100
+            final = values[:, -1] / self.initial_capital
+            metrics.append(pl.DataFrame({
+                'Total Return': (final - 1) * 100,
+                'Annual Return': (final ** (252 / n) - 1) * 100,
+                'Sharpe Ratio': np.sqrt(252) * returns.mean(axis=1) / returns.std(axis=1, ddof=1),
+                'Max Drawdown': drawdowns.min(axis=1),
+                'Num Trades': counts,
+            }))
+        return pl.concat([pl.DataFrame(params), pl.concat(metrics)], how='horizontal')
+
+    def grid_search(self, strategy: Callable[[pl.DataFrame, int, int], List[int]], param_grid: Dict[str, List],
+                    sort_by: str = 'Total Return', chunk_size: int = 256) -> pl.DataFrame:
+        """
+        Evaluate every combination of param_grid in batched simulations over chunks of parameter sets
+
+        Parameters:
+        strategy: Function returning position signals, called once per parameter set
+        param_grid: Mapping of parameter name to candidate values,
+                    e.g. {'short_window': range(10, 50), 'long_window': range(50, 200)}
+        sort_by: Metric column used to rank the result
+        chunk_size: Parameter sets whose signals are generated and simulated together, bounds memory
+                    at chunk_size x bars instead of the whole grid
+
+        Returns:
+        Metrics table keyed by the parameter columns, best first
+        """
+        names = list(param_grid)
+        params = [dict(zip(names, combo)) for combo in itertools.product(*param_grid.values())]
+        n = len(self.data)
+        results = []
+        for start in range(0, len(params), chunk_size):
+            chunk = params[start:start + chunk_size]
+            signals = np.zeros((len(chunk), n), dtype=np.int8)
+            for row, p in enumerate(chunk):
+                signals[row] = np.asarray(self._signals(strategy, **p)[:n], dtype=np.int8)
+            results.append(self.simulate_grid(signals, chunk, chunk_size))
+        return pl.concat(results).sort(sort_by, descending=True, nulls_last=True)
+
+    def optimize_strategy(self, strategy: Callable[..., List[int]] = None, n_trials: int = 30, n_jobs: int = -1,
+                          mode: str = 'thread', progress: Callable[..., None] = None, storage: str = STUDY_STORAGE,
+                          study_name: str = None, n_slices: int = 4, seed: int = None) -> dict:
+        """
+        Optimizes the strategy's declared PARAMS (see search_space) for total return using Optuna.
+
+        Parameters:
+        strategy: Strategy function, the MACD example strategy when None
+        n_trials: Trials to add to the study
+        n_jobs: Parallel workers, -1 uses every core
+        mode: 'thread' runs trials on Optuna's thread pool, 'process' spreads them over a process pool
+        progress: Optional callback receiving trials completed and best value so far
+        storage: Optuna storage URL, the study is resumed when it already exists there, None keeps it in memory
+        study_name: Study to create or resume, derived from the strategy source, symbol, data and space when None
+        n_slices: Time slices each trial reports its running return after, the pruner can stop it at any of them
+        seed: Optional sampler seed
 
         Returns:
         Dictionary of optimized parameters
         """
-        data=self.data
-        def objective(trial):
-            short_window = trial.suggest_int('short_window', 10, 50)
-            long_window = trial.suggest_int('long_window', 50, 200)
-            #total_return = obf(data, short_window=short_window, long_window=long_window)
-            return self.returns_strategy(data,short_window=short_window, long_window=long_window)
-        study = optuna.create_study(direction='maximize')
-        study.optimize(objective, n_trials=n_trials, n_jobs=-1)
+        strategy = strategy or main
+        space = search_space(strategy)
+        if storage is not None and study_name is None:
+            study_name = self._study_name(strategy, space, mode, n_slices)
+        study = _new_study(storage, study_name, seed)
+        memo = _memo_from(study)
+        offset = len(study.trials)
+        bounds = _slice_bounds(0, len(self.data), n_slices)
+        if progress is not None:
+            progress(phase='optimizing', trials=0, n_trials=n_trials, best_value=None)
+        if mode == 'process':
+            return self._optimize_processes(study, strategy, space, bounds, memo, n_trials, n_jobs, progress, offset)
+        if mode != 'thread':
+            raise ValueError(f"Unknown optimizer mode '{mode}', expected 'thread' or 'process'")
+        callbacks = [lambda study, trial: _report_trials(study, progress, offset)] if progress is not None else None
+        study.optimize(_objective(self, strategy, space, bounds, memo), n_trials=n_trials, n_jobs=n_jobs,
+                       callbacks=callbacks)
+        return study.best_params
+
+    def _study_name(self, strategy: Callable[..., List[int]], space: Dict, mode: str = 'thread', n_slices: int = 4) -> str:
+        """
+        Stable name for a study of strategy on this data, a new one starts when any input changes
+
+        n_slices is part of it because the pruner compares intermediate values step by step, and steps of
+        a different slicing are not comparable.
+        """
+        source = strategy.__globals__.get('__source_hash__')
+        if source is None and strategy.__globals__.get('__file__'):
+            with open(strategy.__globals__['__file__'], 'rb') as f:
+                source = hashlib.sha256(f.read()).hexdigest()
+        if self.data_version is None:
+            self.data_version = indicator_cache.data_version(self.data)
+        key = json.dumps({'strategy': source or strategy.__qualname__, 'symbol': self.symbol, 'space': space,
+                          'data': self.data_version,
+                          'mode': mode, 'n_slices': n_slices}, sort_keys=True, default=str)
+        return f"{self.symbol or 'data'}-{strategy.__name__}-{hashlib.sha256(key.encode()).hexdigest()[:16]}"
+
+    def _optimize_processes(self, study: optuna.study.Study, strategy: Callable[..., List[int]], space: Dict,
+                            bounds: List[int], memo: Dict[tuple, float], n_trials: int, n_jobs: int,
+                            progress: Callable[..., None] = None, offset: int = 0) -> dict:
+        """
+        Ask/tell Optuna loop with trials evaluated in worker processes.
+
+        Price columns are published once in shared memory; each worker attaches and builds
+        its frame in the pool initializer, so a trial only ships its parameter dict and book.
+        Each time slice is its own submission: the running return comes back, the pruner is
+        applied here, and only a trial that survives gets its next slice queued.
+        """
+        workers = os.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+        shm, meta = _publish_columns(self.data)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                                     initializer=_init_trial_worker,
+                                     initargs=(shm.name, meta, strategy.__globals__['__file__'])) as pool:
+                running = {}
+                asked = 0
+                while asked < n_trials or running:
+                    while asked < n_trials and len(running) < workers:
+                        trial = study.ask()
+                        params = _suggest_params(trial, space)
+                        asked += 1
+                        if _param_key(params) in memo:
+                            value = memo[_param_key(params)]
+                            if value is None:
+                                study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+                            else:
+                                study.tell(trial, value)
+                            continue
+                        running[pool.submit(_run_slice, params, bounds[0], bounds[1], None)] = (trial, params, 0)
+                    if not running:
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        trial, params, step = running.pop(future)
+                        if future.exception() is not None:
+                            study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                        else:
+                            value, book = future.result()
+                            trial.report(value, step)
+                            if trial.should_prune():
+                                memo[_param_key(params)] = None
+                                study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+                            elif step + 2 < len(bounds):
+                                running[pool.submit(_run_slice, params, bounds[step + 1], bounds[step + 2],
+                                                    book)] = (trial, params, step + 1)
+                                continue
+                            else:
+                                memo[_param_key(params)] = value
+                                study.tell(trial, value)
+                        if progress is not None:
+                            _report_trials(study, progress, offset)
+        finally:
+            shm.close()
+            shm.unlink()
         return study.best_params
 
+    def walk_forward(self, strategy: Union[Callable[..., List[int]], str], train_bars: int, test_bars: int,
+                     anchored: bool = False, n_trials: int = 30, n_jobs: int = -1, mode: str = 'thread',
+                     strategy_dir: str = 'strategies', seed: int = None,
+                     progress: Callable[..., None] = None) -> tuple:
+        """
+        Walk-forward optimization: fit parameters on each training window, trade them on the following
+        test window, and stitch the test windows into one out-of-sample equity curve
+
+        Parameters:
+        strategy: Strategy function, or a file name in strategy_dir (required for mode='process')
+        train_bars: Bars per training window
+        test_bars: Bars per test window
+        anchored: Grow the training window from the first bar instead of rolling it
+        n_trials: Optuna trials per fold
+        n_jobs: Folds optimized at once, -1 uses every core
+        mode: 'thread' shares this Backtester and its indicator cache between folds, 'process' publishes
+              the prices once in shared memory and workers each keep their own indicator cache
+        seed: Optional sampler seed, fold i uses seed + i
+        progress: Optional callback receiving folds done and total
+
+        Returns:
+        (metrics, folds) where folds has one row per fold with its ranges, best parameters and returns.
+        The stitched curve is left in self.portfolio_values and self.oos_equity
+        """
+        n = len(self.data)
+        folds = walk_forward_folds(n, train_bars, test_bars, anchored)
+        if not folds:
+            raise ValueError(f"Need more than train_bars={train_bars} bars for a fold, got {n}")
+        seeds = [None if seed is None else seed + i for i in range(len(folds))]
+        workers = min(os.cpu_count() if n_jobs == -1 else max(1, n_jobs), len(folds))
+        strategy_name = strategy if isinstance(strategy, str) else None
+        if strategy_name is not None:
+            from strategy_registry import StrategyRegistry
+            strategy = StrategyRegistry(strategy_dir).get(strategy_name)
+        shm = None
+        if mode == 'process':
+            if strategy_name is None:
+                raise ValueError("mode='process' needs the strategy file name so workers can load it")
+            if self.data_version is None:
+                self.data_version = indicator_cache.data_version(self.data)
+            shm, meta = _publish_columns(self.data)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                                       initializer=_init_fold_worker,
+                                       initargs=(shm.name, meta, strategy_dir, strategy_name, self.symbol, self.data_version))
+            submit = lambda fold, fold_seed: pool.submit(_run_fold, fold[0], fold[1], n_trials, fold_seed)
+        elif mode == 'thread':
+            pool = ThreadPoolExecutor(max_workers=workers)
+            submit = lambda fold, fold_seed: pool.submit(_optimize_fold, self, strategy, fold[0], fold[1], n_trials, fold_seed)
+        else:
+            raise ValueError(f"Unknown walk-forward mode '{mode}', expected 'thread' or 'process'")
+
+        try:
+            with pool:
+                futures = {submit(fold, fold_seed): i for i, (fold, fold_seed) in enumerate(zip(folds, seeds))}
+                fitted = [None] * len(folds)
+                for future in as_completed(futures):
+                    fitted[futures[future]] = future.result()
+                    if progress is not None:
+                        progress(phase='walk-forward', done=sum(f is not None for f in fitted), total=len(folds))
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        # Trade each fold's parameters on its test window, carrying equity from one window to the next
+        opn = self.data['open'].to_numpy().astype(np.float64)
+        close = self.data['close'].to_numpy().astype(np.float64)
+        dates = self.data['date']
+        capital = self.initial_capital
+        equity, rows, trades = [self.initial_capital], [], 0
+        for (train_start, train_end, test_start, test_end), (params, train_return) in zip(folds, fitted):
+            signals = np.asarray(self._signals(strategy, **params)[:n], dtype=np.int64)
+            values, counts = _simulate_batch(signals[None, test_start:test_end], opn[test_start:test_end],
+                                             close[test_start:test_end], capital)
+            rows.append({'Fold': len(rows), 'Train Start': dates[train_start], 'Train End': dates[train_end - 1],
+                         'Test Start': dates[test_start], 'Test End': dates[test_end - 1], **params,
+                         'Train Return': train_return, 'Test Return': (values[0, -1] / capital - 1) * 100,
+                         'Num Trades': int(counts[0])})
+            equity.extend(values[0, 1:].tolist())
+            capital = values[0, -1]
+            trades += int(counts[0])
+
+        self.portfolio_values = equity
+        start = folds[0][2]
+        self.oos_equity = pl.DataFrame({'date': dates[start:], 'value': equity[1:]})
+        values = np.asarray(equity)
+        returns = values[1:] / values[:-1] - 1
+        metrics = {
+            'Total Return': float((values[-1] / self.initial_capital - 1) * 100),
+            'Annual Return': float(((values[-1] / self.initial_capital) ** (252 / (len(values) - 1)) - 1) * 100),
+            'Sharpe Ratio': float(np.sqrt(252) * returns.mean() / returns.std(ddof=1)),
+            'Max Drawdown': float(((values / np.maximum.accumulate(values) - 1) * 100).min()),
+            'Num Trades': trades,
+            'Num Folds': len(folds),
+            'Buy&Hold Return': float((close[-1] / close[start] - 1) * 100),
+        }
+        return metrics, pl.DataFrame(rows)
+
     def calculate_annual_return(signals, data):
         # Calculate annual return based on signals and data
         # This is a simplified example and actual implementation may vary
@@ -300,3 +1149,128 @@ class Backtester:
             elif signals[i] == -1:
                 annual_return -= data['close'][i]
         return annual_return
+
+
+def pivot_prices(data: pl.DataFrame, value: str = 'close', time_col: str = 'date') -> pl.DataFrame:
+    """Long bars (one row per symbol and date) to a wide frame with one price column per symbol"""
+    return data.pivot(on='symbol', index=time_col, values=value, aggregate_function='last').sort(time_col)
+
+
+class PortfolioBacktester:
+    def __init__(self, prices: pl.DataFrame, initial_capital: float = 100000.0, fill_prices: pl.DataFrame = None,
+                 time_col: str = 'date'):
+        """
+        Multi-asset backtest with one pool of cash shared by every symbol
+
+        Parameters:
+        prices: Wide frame, a time column plus one close-price column per symbol (see pivot_prices)
+        initial_capital: Starting cash
+        fill_prices: Optional wide frame of execution prices (e.g. opens) with the same layout, defaults to prices
+        time_col: Name of the time column
+        """
+        self.time_col = time_col
+        self.prices = prices.sort(time_col)
+        self.symbols = [c for c in self.prices.columns if c != time_col]
+        self.initial_capital = initial_capital
+        # Symbols that have not listed yet or missed a bar keep their last price for valuation
+        self.close = self.prices.select(self.symbols).fill_null(strategy='forward').to_numpy().astype(np.float64)
+        if fill_prices is None:
+            self.fill = self.close
+        else:
+            fill = fill_prices.sort(time_col).select(self.symbols).to_numpy().astype(np.float64)
+            self.fill = np.where(np.isnan(fill), self.close, fill)
+
+    def apply_weights(self, weights: np.ndarray, rebalance_every: int = None, fee_rate: float = 0.0,
+                      fractional: bool = False) -> tuple:
+        """
+        Simulate target weights with shared cash
+
+        Weights are fractions of current equity per symbol (negative for shorts). The book is
+        rebalanced on bars where the target row changes, or every rebalance_every bars when given.
+        Only the rebalance bars are stepped in Python, with all symbols updated at once; holdings
+        and cash are then forward-filled over every bar.
+
+        Parameters:
+        weights: (bars, symbols) target weights, NaN rows keep the previous target
+        rebalance_every: Also rebalance on a fixed bar interval to restore drifted weights
+        fee_rate: Commission as a fraction of traded value
+        fractional: Allow fractional shares, otherwise share counts are truncated to whole shares
+
+        Returns:
+        Dictionary of performance metrics and a frame of equity, cash and per-symbol holding values
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        n, m = self.close.shape
+        if weights.shape != (n, m):
+            raise ValueError(f"weights must have shape {(n, m)}, got {weights.shape}")
+        # Forward-fill NaN rows, then no position in symbols without a price yet
+        row = np.where(np.isnan(weights).all(axis=1), -1, np.arange(n))
+        row = np.maximum.accumulate(row)
+        weights = np.where(row[:, None] >= 0, np.nan_to_num(weights[np.maximum(row, 0)]), 0.0)
+        weights = np.where(np.isnan(self.fill), 0.0, weights)
+        fill = np.nan_to_num(self.fill, nan=1.0)
+        close = np.nan_to_num(self.close)
+
+        changed = np.empty(n, dtype=bool)
+        changed[0] = weights[0].any()
+        changed[1:] = (weights[1:] != weights[:-1]).any(axis=1)
+        if rebalance_every:
+            changed[::rebalance_every] |= weights[::rebalance_every].any(axis=1)
+        rebal = np.flatnonzero(changed)
+
+        cash_after = np.empty(len(rebal) + 1)
+        shares_after = np.empty((len(rebal) + 1, m))
+        cash, shares = float(self.initial_capital), np.zeros(m)
+        cash_after[0], shares_after[0] = cash, shares
+        turnover = 0.0
+        for j, i in enumerate(rebal):
+            equity = cash + shares @ fill[i]
+            target = equity * weights[i] / fill[i]
+            if not fractional:
+                target = np.trunc(target)
+            traded = np.abs(target - shares) @ fill[i]
+            cash -= (target - shares) @ fill[i] + fee_rate * traded
+            turnover += traded
+            shares = target
+            cash_after[j + 1], shares_after[j + 1] = cash, shares
+
+        state = np.cumsum(changed)
+        holdings = shares_after[state] * close
+        equity = cash_after[state] + holdings.sum(axis=1)
+
+        values = np.concatenate(([self.initial_capital], equity))
+        returns = values[1:] / values[:-1] - 1
+        metrics = {
+            'Total Return': float((values[-1] / self.initial_capital - 1) * 100),
+            'Annual Return': float(((values[-1] / self.initial_capital) ** (252 / n) - 1) * 100),
+            'Sharpe Ratio': float(np.sqrt(252) * returns.mean() / returns.std(ddof=1)),
+            'Max Drawdown': float(((values / np.maximum.accumulate(values) - 1) * 100).min()),
+            'Num Rebalances': len(rebal),
+            'Turnover': float(turnover / self.initial_capital),
+        }
+        result = pl.DataFrame({self.time_col: self.prices[self.time_col], 'equity': equity,
+                               'cash': cash_after[state]})
+        result = result.hstack(pl.DataFrame(holdings, schema=self.symbols))
+        return metrics, result
+
+    def apply_signals(self, signals: np.ndarray, allow_short: bool = False, **kwargs) -> tuple:
+        """
+        Simulate per-symbol 1/-1/0 signals as an equal-weight book
+
+        Each symbol holds the direction of its last non-zero signal; capital is split equally
+        across the symbols currently held. Short sells hold a negative weight when allow_short,
+        otherwise -1 just exits.
+
+        Parameters:
+        signals: (bars, symbols) signal matrix
+        kwargs: Passed to apply_weights
+        """
+        signals = np.asarray(signals)
+        n = signals.shape[0]
+        last = np.maximum.accumulate(np.where(signals != 0, np.arange(n)[:, None], -1), axis=0)
+        position = np.where(last >= 0, np.take_along_axis(signals, np.maximum(last, 0), axis=0), 0).astype(np.float64)
+        if not allow_short:
+            position = np.maximum(position, 0.0)
+        held = np.abs(position).sum(axis=1, keepdims=True)
+        weights = np.divide(position, held, out=np.zeros_like(position), where=held > 0)
+        return self.apply_weights(weights, **kwargs)
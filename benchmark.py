@@ -0,0 +1,212 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import polars as pl
+
+import indicator_cache
+from backtest import Backtester
+from strategy_registry import registry
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+# 2000-01-01, epoch seconds of the first synthetic bar
+START = 946684800
+
+
+def synthetic_ohlcv(n: int, symbol: str = 'SYN', seed: int = 0, start: int = START) -> pl.DataFrame:
+    """
+    Random-walk minute bars shaped like stockdata.csv
+
+    Parameters:
+    n: Bars to generate
+    symbol: Value of the 'symbol' column
+    seed: RNG seed, the same seed always gives the same series
+    start: Epoch seconds of the first bar
+    """
+    rng = np.random.default_rng(seed)
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    opn = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.0005, n))
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    return pl.DataFrame({
+        'date': pl.from_epoch(pl.Series(start + 60 * np.arange(n, dtype=np.int64)), time_unit='s'),
+        'open': opn,
+        'high': np.maximum(opn, close) + spread,
+        'low': np.minimum(opn, close) - spread,
+        'close': close,
+        'volume': rng.integers(100, 10_000, n).astype(np.float64),
+        'symbol': symbol,
+    })
+
+
+def _measure(fn: Callable[[], object], repeat: int, memory: bool) -> tuple:
+    """Best and mean wall time over repeat calls, then Python/NumPy peak allocation of one traced call"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        # Traced separately, tracemalloc slows down allocation-heavy code
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, min(times), sum(times) / len(times), peak
+
+
+def _rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far, includes Polars' native allocations"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'numpy': np.__version__,
+            'polars': pl.__version__}
+
+
+def run_benchmarks(sizes: List[int], strategies: List[str], engines: List[str], repeat: int = 3,
+                   loop_max: int = 1_000_000, memory: bool = True, seed: int = 0) -> List[Dict]:
+    """
+    Time every backtest phase for each data size and strategy
+
+    Phases: filter (symbol/date filter and Backtester setup), signals, simulate (per engine), metrics,
+    max_drawdown, figure (build and serialize), plus returns_strategy (the optimizer's old objective).
+    The loop engine and returns_strategy walk bars in Python and are skipped above loop_max bars.
+
+    Parameters:
+    sizes: Bar counts to generate
+    strategies: Strategy files in strategies/
+    engines: Simulation engines, 'vector' and/or 'loop'
+    repeat: Timed calls per phase, the best is reported
+    loop_max: Largest size the Python loop phases run at
+    memory: Also record the traced peak allocation of each phase
+    seed: Seed of the synthetic data
+
+    Returns:
+    One record per (size, strategy, phase, engine)
+    """
+    env = _environment()
+    records = []
+
+    def record(n, phase, measured, strategy=None, engine=None):
+        _, best, mean, peak = measured
+        row = {**env, 'bars': n, 'strategy': strategy, 'phase': phase, 'engine': engine, 'seconds': best,
+               'mean_seconds': mean, 'peak_mb': peak, 'rss_mb': _rss_mb()}
+        records.append(row)
+        print(f"{n:>10} {strategy or '-':>10} {phase:>16} {engine or '-':>6} {best:10.4f}s"
+              + (f" {peak:9.1f}MB" if peak is not None else ''), flush=True)
+
+    for n in sizes:
+        # Target symbol plus a smaller one the filter has to skip
+        source = pl.concat([synthetic_ohlcv(n, 'SYN', seed), synthetic_ohlcv(max(n // 4, 1), 'OTHER', seed + 1)]).lazy()
+        # Skip the first tenth of the history so the date predicate does some work
+        first = pl.from_epoch(pl.Series([START + 60 * (n // 10)]), time_unit='s')[0]
+
+        def load():
+            data = source.filter((pl.col('symbol') == 'SYN') & (pl.col('date') >= first)).collect()
+            return Backtester(data, symbol='SYN', data_version=n)
+
+        measured = _measure(load, repeat, memory)
+        backtester = measured[0]
+        record(n, 'filter', measured)
+
+        if n <= loop_max:
+            record(n, 'returns_strategy', _measure(
+                lambda: (indicator_cache.cache.clear(), backtester.returns_strategy(backtester.data))[1], repeat, memory))
+
+        for name in strategies:
+            strategy = registry.get(name)
+
+            def signals():
+                # Cold indicator cache, otherwise every call after the first is a lookup
+                indicator_cache.cache.clear()
+                return backtester._signals(strategy)
+
+            measured = _measure(signals, repeat, memory)
+            record(n, 'signals', measured, name)
+            sig = measured[0]
+
+            for engine in engines:
+                if engine == 'loop' and n > loop_max:
+                    continue
+                record(n, 'simulate', _measure(lambda: backtester.simulate(sig, engine), repeat, memory), name, engine)
+
+            record(n, 'metrics', _measure(backtester.metrics, repeat, memory), name)
+            record(n, 'max_drawdown', _measure(backtester._calculate_max_drawdown, repeat, memory), name)
+            record(n, 'figure', _measure(backtester.figure_json, repeat, memory), name)
+        del source, backtester
+        indicator_cache.cache.clear()
+    return records
+
+
+def compare(records: List[Dict], baseline: str) -> pl.DataFrame:
+    """
+    Ratio of this run's times to the latest run recorded in a baseline results file
+
+    Parameters:
+    records: Output of run_benchmarks
+    baseline: JSON-lines file written by an earlier run
+    """
+    base = pl.read_ndjson(baseline)
+    base = base.filter(pl.col('timestamp') == base['timestamp'].max())
+    keys = ['bars', 'strategy', 'phase', 'engine']
+    current = pl.DataFrame(records).select(keys + ['seconds'])
+    return (current.join(base.select(keys + [pl.col('seconds').alias('baseline_seconds')]), on=keys, how='inner',
+                         nulls_equal=True)
+            .with_columns((pl.col('baseline_seconds') / pl.col('seconds')).alias('speedup')))
+
+
+def _parse_size(value: str) -> int:
+    value = value.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(value[-1], 1)
+    return int(float(value.rstrip('km')) * scale)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time backtest phases on synthetic data')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='Comma separated bar counts, k/m suffixes allowed')
+    parser.add_argument('--strategies', default='macd.py,test.py')
+    parser.add_argument('--engines', default='vector,loop')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--loop-max', default='1m', help='Largest size for the Python loop phases')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced peak memory pass')
+    parser.add_argument('--output', default='benchmarks.jsonl', help='Results are appended as JSON lines')
+    parser.add_argument('--compare', help='Earlier results file to print speedups against')
+    args = parser.parse_args()
+
+    results = run_benchmarks([_parse_size(s) for s in args.sizes.split(',')], args.strategies.split(','),
+                             args.engines.split(','), repeat=args.repeat, loop_max=_parse_size(args.loop_max),
+                             memory=not args.no_memory)
+    if args.compare:
+        with pl.Config(tbl_rows=-1):
+            print(compare(results, args.compare))
+    with open(args.output, 'a') as f:
+        for row in results:
+            f.write(json.dumps(row, default=str) + '\n')
+    print(f"{len(results)} results appended to {args.output}")
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+import polars as pl
+
+# Points per line trace sent to the browser, longer series are downsampled
+MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 2000))
+# Series longer than this are drawn with WebGL
+WEBGL_POINTS = int(os.environ.get('CHART_WEBGL_POINTS', 1000))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling, returns the indices of the points to keep
+
+    The first and last points are always kept. Every bucket in between keeps the point forming the
+    largest triangle with the point kept before it and the mean of the next bucket, so peaks and
+    troughs survive where plain striding would drop them.
+
+    Parameters:
+    x: Numeric x values, ascending
+    y: Values to preserve the shape of, NaNs are treated as 0
+    n_out: Points to keep
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nlo, nhi = hi, edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def _numeric(x: pl.Series) -> np.ndarray:
+    return x.to_physical().to_numpy().astype(np.float64) if x.dtype.is_temporal() else x.to_numpy().astype(np.float64)
+
+
+def line(x: pl.Series, y, max_points: int = None, **kwargs) -> go.Scatter:
+    """
+    Line trace downsampled with LTTB to max_points, drawn with WebGL when the series is long
+
+    Parameters:
+    x: Date (or numeric) column shared by the chart
+    y: Values, any sequence the same length as x
+    max_points: Points kept, MAX_POINTS when None
+    kwargs: Passed to go.Scatter / go.Scattergl
+    """
+    y = np.asarray(y, dtype=np.float64)
+    keep = lttb(_numeric(x), y, max_points or MAX_POINTS)
+    trace = go.Scattergl if len(y) > WEBGL_POINTS else go.Scatter
+    return trace(x=x.gather(keep).to_list(), y=y[keep], **kwargs)
+
+
+def markers(x: pl.Series, y, name: str, symbol: str, color: str, max_points: int = None, **kwargs) -> go.Scatter:
+    """
+    One marker trace for all trades of a side instead of a trace per trade
+
+    Parameters:
+    x: Trade dates
+    y: Trade prices
+    max_points: Markers kept, evenly spaced when there are more trades, MAX_POINTS when None
+    """
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.unique(np.linspace(0, len(y) - 1, min(len(y), max_points or MAX_POINTS)).astype(np.int64))
+    trace = go.Scattergl if len(y) > WEBGL_POINTS else go.Scatter
+    return trace(x=x.gather(keep).to_list(), y=y[keep], mode='markers', name=name,
+                 marker=dict(symbol=symbol, color=color, size=15), **kwargs)
+
+
+def box(values, name: str) -> go.Box:
+    """Box plot from precomputed quartiles so the raw values are not shipped to the browser"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return go.Box(y=[], name=name)
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return go.Box(q1=[q1], median=[median], q3=[q3], lowerfence=[inside.min()], upperfence=[inside.max()],
+                  mean=[values.mean()], name=name)
@@ -1,17 +1,20 @@
-from fyers_api.websocket import websocket
-from fyers_api import fyersModel
-import vectorbt as vbt
-import pandas as pd
-import numpy as np
 import asyncio
 import json
 import logging
-from typing import Dict, List, Optional, Union
-from datetime import datetime, timedelta
+from streaming import MACrossover, TickBuffer, BarAggregator, BarHistory
+from strategy_registry import registry
 
 class FyersRealTimeTrading:
-    def __init__(self, config_path: str = 'fyers_config.json'):
-        """Initialize Fyers trading system"""
+    def __init__(self, config_path: str = 'fyers_config.json', config: dict = None, fyers=None, ws=None):
+        """
+        Initialize Fyers trading system
+
+        Parameters:
+        config_path: JSON config file, ignored when config is given
+        config: Config dict, e.g. for replay runs without credentials
+        fyers: Broker client with get_funds/place_order, a FyersModel is created when None
+        ws: Feed with on_message/connect/subscribe/close, a FyersSocket is created when None
+        """
         # Setup logging
         logging.basicConfig(
             level=logging.INFO,
@@ -20,12 +23,20 @@ class FyersRealTimeTrading:
         self.logger = logging.getLogger(__name__)
         
         # Load configuration
-        self.config = self._load_config(config_path)
-        self.fyers = self._initialize_fyers()
-        self.ws = None
+        self.config = config if config is not None else self._load_config(config_path)
+        self.fyers = fyers if fyers is not None else self._initialize_fyers()
+        self.ws = ws
         self.data_buffer = {}
         self.active_positions = {}
         self.orders = {}
+        self.pending_orders = set()
+        # Loop that runs the trader, the Fyers SDK calls on_message from its own socket thread
+        self.loop = None
+        self.signals = {}
+        self.bars = {}
+        self.bar_history = {}
+        # Optional bar strategy from strategies/, run on each completed bar instead of per tick
+        self.strategy = registry.get(self.config['strategy']) if self.config.get('strategy') else None
         
     def _load_config(self, config_path: str) -> dict:
         """Load Fyers configuration"""
@@ -40,8 +51,10 @@ class FyersRealTimeTrading:
             self.logger.error(f"Error loading config: {str(e)}")
             raise
     
-    def _initialize_fyers(self) -> fyersModel.FyersModel:
-        """Initialize Fyers API connection"""
+    def _initialize_fyers(self):
+        """Initialize Fyers API connection, returns a FyersModel"""
+        # Imported here so replays and tests with their own broker don't need the Fyers SDK
+        from fyers_api import fyersModel
         try:
             fyers = fyersModel.FyersModel(
                 client_id=self.config['client_id'],
@@ -57,11 +70,14 @@ class FyersRealTimeTrading:
     async def connect_websocket(self):
         """Establish websocket connection"""
         try:
-            self.ws = websocket.FyersSocket(
-                access_token=f"{self.config['client_id']}:{self.config['access_token']}",
-                log_path="logs",
-                websocket_client_instance=None
-            )
+            self.loop = asyncio.get_running_loop()
+            if self.ws is None:
+                from fyers_api.websocket import websocket
+                self.ws = websocket.FyersSocket(
+                    access_token=f"{self.config['client_id']}:{self.config['access_token']}",
+                    log_path="logs",
+                    websocket_client_instance=None
+                )
             
             # Define callback for data handling
             def on_message(message):
@@ -86,21 +102,22 @@ class FyersRealTimeTrading:
         try:
             symbol = message['symbol']
             
-            # Update data buffer
+            # Update data buffer, a fixed ring of the most recent 1000 ticks
             if symbol not in self.data_buffer:
-                self.data_buffer[symbol] = []
+                self.data_buffer[symbol] = TickBuffer(1000)
             
-            self.data_buffer[symbol].append({
-                'timestamp': message['timestamp'],
-                'price': message['ltp'],
-                'volume': message['volume']
-            })
-            
-            # Keep only recent data
-            self.data_buffer[symbol] = self.data_buffer[symbol][-1000:]
+            self.data_buffer[symbol].append(message['timestamp'], message['ltp'], message['volume'])
             
             # Run strategy check
-            self._check_signals(symbol)
+            if self.strategy is None:
+                self._check_signals(symbol)
+            else:
+                if symbol not in self.bars:
+                    self.bars[symbol] = BarAggregator(self.config.get('bar_interval', '1m'))
+                    self.bar_history[symbol] = BarHistory()
+                bar = self.bars[symbol].update(message['timestamp'], message['ltp'], message['volume'])
+                if bar is not None:
+                    self._on_bar(symbol, bar)
             
         except Exception as e:
             self.logger.error(f"Error processing market data: {str(e)}")
@@ -108,24 +125,34 @@ class FyersRealTimeTrading:
     def _check_signals(self, symbol: str):
         """Check for trading signals"""
         try:
-            # Convert buffer to DataFrame
-            df = pd.DataFrame(self.data_buffer[symbol])
-            df.set_index('timestamp', inplace=True)
-            
-            # Run strategy (example using dual MA crossover)
-            fast_ma = vbt.MA.run(df['price'], window=self.config['fast_ma'])
-            slow_ma = vbt.MA.run(df['price'], window=self.config['slow_ma'])
+            # Dual MA crossover kept as streaming state, O(1) per tick instead of
+            # rebuilding a DataFrame and re-running vbt.MA over the whole buffer
+            if symbol not in self.signals:
+                self.signals[symbol] = MACrossover(self.config['fast_ma'], self.config['slow_ma'])
+            signal = self.signals[symbol].update(self.data_buffer[symbol].last_price)
             
             # Generate signals
-            if len(df) > self.config['slow_ma']:
-                if fast_ma.ma_crossed_above(slow_ma)[-1]:
-                    self._place_order(symbol, 'BUY')
-                elif fast_ma.ma_crossed_below(slow_ma)[-1]:
-                    self._place_order(symbol, 'SELL')
+            if signal == 1:
+                self._submit_order(symbol, 'BUY')
+            elif signal == -1:
+                self._submit_order(symbol, 'SELL')
                     
         except Exception as e:
             self.logger.error(f"Error checking signals: {str(e)}")
 
+    def _on_bar(self, symbol: str, bar: dict):
+        """Run the bar strategy once per completed bar and act on its latest signal"""
+        try:
+            history = self.bar_history[symbol]
+            history.append(bar)
+            signals = self.strategy(history.frame())
+            if signals[-1] == 1:
+                self._submit_order(symbol, 'BUY')
+            elif signals[-1] == -1:
+                self._submit_order(symbol, 'SELL')
+        except Exception as e:
+            self.logger.error(f"Error running bar strategy: {str(e)}")
+
     def _calculate_position_size(self, symbol: str, price: float) -> int:
         """Calculate position size based on risk management"""
         try:
@@ -137,10 +164,26 @@ class FyersRealTimeTrading:
             self.logger.error(f"Error calculating position size: {str(e)}")
             return 0
 
+    def _submit_order(self, symbol: str, side: str):
+        """Schedule _place_order on the trader's loop from the synchronous market data callback, on any thread"""
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._schedule_order(symbol, side)
+        else:
+            self.loop.call_soon_threadsafe(self._schedule_order, symbol, side)
+
+    def _schedule_order(self, symbol: str, side: str):
+        task = self.loop.create_task(self._place_order(symbol, side))
+        self.pending_orders.add(task)
+        task.add_done_callback(self.pending_orders.discard)
+
     async def _place_order(self, symbol: str, side: str):
         """Place order with Fyers"""
         try:
-            current_price = self.data_buffer[symbol][-1]['price']
+            current_price = self.data_buffer[symbol].last_price
             position_size = self._calculate_position_size(symbol, current_price)
             
             if position_size == 0:
@@ -227,8 +270,8 @@ class FyersRealTimeTrading:
         """Monitor active positions for stop loss and target"""
         while True:
             try:
-                for symbol, position in self.active_positions.items():
-                    current_price = self.data_buffer[symbol][-1]['price']
+                for symbol, position in list(self.active_positions.items()):
+                    current_price = self.data_buffer[symbol].last_price
                     
                     # Check stop loss
                     if (position['side'] == 'BUY' and current_price <= position['stop_loss']) or \
@@ -254,13 +297,9 @@ class FyersRealTimeTrading:
             # Connect to websocket
             await self.connect_websocket()
             
-            # Start position monitoring
-            monitor_task = asyncio.create_task(self._monitor_positions())
-            
-            # Keep the main loop running
-            while True:
-                await asyncio.sleep(1)
-                
+            # Monitor positions until cancelled, this keeps the trader running
+            await self._monitor_positions()
+
         except Exception as e:
             self.logger.error(f"Error in trading loop: {str(e)}")
         finally:
@@ -276,7 +315,10 @@ if __name__ == "__main__":
         "symbols": ["NSE:NIFTY-INDEX", "NSE:BANKNIFTY-INDEX"],
         "risk_per_trade": 0.02,
         "fast_ma": 20,
-        "slow_ma": 50
+        "slow_ma": 50,
+        # Optional: run a strategies/*.py main(data) on completed bars instead of the tick MA crossover
+        # "strategy": "macd.py",
+        # "bar_interval": "5m"
     }
     
     # Initialize and start trading
@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+from urllib.parse import quote
+
+import polars as pl
+
+# Column types every store holds, whatever the source file used
+SCHEMA = {'date': pl.Datetime('us'), 'open': pl.Float64, 'high': pl.Float64, 'low': pl.Float64,
+          'close': pl.Float64, 'volume': pl.Float64, 'symbol': pl.String}
+# Bumped when the on-disk layout changes, older stores are rebuilt
+FORMAT = 2
+
+
+def scan_source(source: str) -> pl.LazyFrame:
+    """Lazy scan of a parquet or csv bar file, nothing is read until collect"""
+    if source.endswith('.csv'):
+        return pl.scan_csv(source, try_parse_dates=True)
+    return pl.scan_parquet(source)
+
+
+def _time_filter(lf: pl.LazyFrame, time_col: str, start: Optional[datetime], end: Optional[datetime]) -> pl.LazyFrame:
+    """Add an inclusive start/end predicate on time_col, cast to the column's own type"""
+    dtype = lf.collect_schema()[time_col]
+    if start is not None:
+        lf = lf.filter(pl.col(time_col) >= pl.lit(start).cast(dtype))
+    if end is not None:
+        lf = lf.filter(pl.col(time_col) <= pl.lit(end).cast(dtype))
+    return lf
+
+
+def normalize(lf: pl.LazyFrame, time_col: Optional[str] = None) -> pl.LazyFrame:
+    """
+    Cast source bars to SCHEMA, the timestamp column becomes 'date'
+
+    Parameters:
+    lf: Bars with a timestamp column, OHLCV and 'symbol'
+    time_col: Timestamp column, 'date' or else 'epoch' when None. Integers are read as epoch seconds,
+              strings are parsed
+    """
+    columns = lf.collect_schema()
+    if time_col is None:
+        time_col = 'date' if 'date' in columns else 'epoch'
+    dtype = columns[time_col]
+    ts = pl.col(time_col)
+    if dtype.is_integer():
+        ts = pl.from_epoch(ts, time_unit='s')
+    elif dtype == pl.String:
+        ts = ts.str.to_datetime()
+    return (lf.select([ts.cast(SCHEMA['date']).alias('date')]
+                      + [pl.col(name).cast(dtype) for name, dtype in SCHEMA.items() if name != 'date'])
+            .drop_nulls(['date', 'symbol']))
+
+
+class MarketDataStore:
+    def __init__(self, root: str = 'data', max_segments: int = 32):
+        """
+        Typed bars kept per symbol as append-only, uncompressed Arrow IPC segments plus an index
+
+        An ingest writes one new segment per symbol that received bars, so its cost follows the new
+        data rather than the history. Every segment is sorted by date and starts after the previous
+        one ends.
+
+        Parameters:
+        root: Directory holding bars/<symbol>/*.arrow and index.json
+        max_segments: A symbol's segments are compacted into one once it has more than this
+        """
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock_path = os.path.join(root, 'ingest.lock')
+        self.max_segments = max_segments
+        self.frames: Dict[str, pl.DataFrame] = {}
+        self.time_col = 'date'
+        self.version = 0
+        self.index: Dict[str, dict] = {}
+        self.loaded = None
+
+    def exists(self) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        with open(self.index_path) as f:
+            return json.load(f).get('format') == FORMAT
+
+    @contextmanager
+    def lock(self, timeout: float = 600):
+        """
+        Hold the store's exclusive writer lock, every build, ingest and compaction runs under it
+
+        Parameters:
+        timeout: Seconds to wait for another writer before raising TimeoutError
+        """
+        os.makedirs(self.root, exist_ok=True)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'{self.lock_path} is held by another ingest, delete it if that process died')
+                time.sleep(0.1)
+        try:
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            yield
+        finally:
+            os.remove(self.lock_path)
+
+    def build(self, data: Union[pl.DataFrame, pl.LazyFrame], time_col: Optional[str] = None) -> 'MarketDataStore':
+        """
+        Replace the store with data, for revisions of bars already stored
+
+        Parameters:
+        data: Bars for every symbol with a 'symbol' column
+        time_col: Timestamp column, see normalize
+        """
+        with self.lock():
+            return self._build(data, time_col)
+
+    def _build(self, data: Union[pl.DataFrame, pl.LazyFrame], time_col: Optional[str] = None) -> 'MarketDataStore':
+        for name in ('bars', 'bars.arrow'):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self.index, self.frames, self.version = {}, {}, 0
+        return self._append(data, time_col)
+
+    def ingest(self, source: str, time_col: Optional[str] = None) -> Dict[str, int]:
+        """Append the new bars of a parquet or csv file, see append"""
+        appended = {}
+        self.append(scan_source(source), time_col=time_col, appended=appended)
+        return appended
+
+    def append(self, data: Union[pl.DataFrame, pl.LazyFrame], time_col: Optional[str] = None,
+               appended: Optional[Dict[str, int]] = None) -> 'MarketDataStore':
+        """
+        Add the bars of each symbol that are newer than its last stored bar
+
+        Bars at or before a symbol's last stored bar are skipped and duplicates within data keep their last
+        row, so re-running an ingest on the same or an overlapping file adds nothing twice. Every symbol that
+        gains bars gets a new version, the store version is the newest of them.
+
+        Parameters:
+        data: Bars for any number of symbols, a LazyFrame is streamed to a temporary file
+        time_col: Timestamp column, see normalize
+        appended: Optional dict filled with the number of bars added per symbol
+        """
+        with self.lock():
+            return self._append(data, time_col, appended)
+
+    def _append(self, data: Union[pl.DataFrame, pl.LazyFrame], time_col: Optional[str] = None,
+                appended: Optional[Dict[str, int]] = None) -> 'MarketDataStore':
+        # The index is re-read under the lock, another writer may have appended since this store opened
+        if os.path.exists(self.index_path):
+            self.open()
+        last = pl.DataFrame({'symbol': list(self.index),
+                             '_last': [datetime.fromisoformat(e['last']) for e in self.index.values()]},
+                            schema={'symbol': pl.String, '_last': SCHEMA['date']})
+        new = (normalize(data.lazy(), time_col)
+               .join(last.lazy(), on='symbol', how='left')
+               .filter(pl.col('_last').is_null() | (pl.col('date') > pl.col('_last')))
+               .drop('_last')
+               .unique(['symbol', 'date'], keep='last')
+               .sort(['symbol', 'date']))
+        fd, staging = tempfile.mkstemp(suffix='.arrow', prefix='ingest-', dir=self.root)
+        os.close(fd)
+        version = time.time_ns()
+        offset = 0
+        try:
+            new.sink_ipc(staging, compression='uncompressed')
+            frame = pl.read_ipc(staging)
+            for symbol, length in frame.group_by('symbol').len().sort('symbol').iter_rows():
+                self._write(symbol, frame.slice(offset, length), version)
+                if appended is not None:
+                    appended[symbol] = length
+                offset += length
+            del frame
+        finally:
+            os.remove(staging)
+        if offset:
+            self.version = version
+        # Saved even when nothing was new, so is_stale() sees the source as ingested
+        self._save()
+        return self.open()
+
+    def _write(self, symbol: str, bars: pl.DataFrame, version: int) -> None:
+        """Write bars as the symbol's next segment and compact its segments past max_segments"""
+        entry = self.index.setdefault(symbol, {'rows': 0, 'first': bars['date'][0].isoformat(), 'segments': [],
+                                               'next': 0})
+        folder = os.path.join('bars', quote(symbol, safe=''))
+        os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        segment = os.path.join(folder, f"{entry['next']:06d}.arrow")
+        entry['next'] += 1
+        bars.write_ipc(os.path.join(self.root, segment), compression='uncompressed')
+        entry['segments'].append(segment)
+        entry['rows'] += len(bars)
+        entry['last'] = bars['date'][-1].isoformat()
+        entry['version'] = version
+        self.frames.pop(symbol, None)
+        if len(entry['segments']) > self.max_segments:
+            old = entry['segments']
+            segment = os.path.join(folder, f"{entry['next']:06d}.arrow")
+            entry['next'] += 1
+            pl.read_ipc([os.path.join(self.root, s) for s in old]).write_ipc(
+                os.path.join(self.root, segment), compression='uncompressed')
+            entry['segments'] = [segment]
+            for s in old:
+                try:
+                    os.remove(os.path.join(self.root, s))
+                except OSError:
+                    # Still memory-mapped by a reader on Windows, it no longer appears in the index
+                    pass
+
+    def _save(self) -> None:
+        # Segments are written first and the index is swapped in last, readers never see a partial ingest
+        fd, tmp = tempfile.mkstemp(suffix='.json', prefix='index-', dir=self.root)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'format': FORMAT, 'time_col': 'date', 'version': self.version, 'symbols': self.index}, f)
+        os.replace(tmp, self.index_path)
+
+    def open(self) -> 'MarketDataStore':
+        """Load the symbol index, segments are memory-mapped on first use. Never writes"""
+        if not self.exists():
+            raise FileNotFoundError(f'No market data store in {self.root}, create it with `python datastore.py FILE`')
+        with open(self.index_path) as f:
+            meta = json.load(f)
+        self.loaded = os.path.getmtime(self.index_path)
+        self.time_col = meta['time_col']
+        # Changes on every ingest that adds bars, downstream caches key on it
+        self.version = meta['version']
+        self.index = meta['symbols']
+        self.frames = {}
+        return self
+
+    def refresh(self) -> None:
+        """Reload the index when another process ingested since it was opened"""
+        if self.loaded is None or os.path.getmtime(self.index_path) != self.loaded:
+            self.open()
+
+    def is_stale(self, source: str) -> bool:
+        """True when source was modified after the store was last updated"""
+        return not self.exists() or os.path.getmtime(source) > os.path.getmtime(self.index_path)
+
+    def symbols(self) -> List[str]:
+        return list(self.index)
+
+    def symbol_version(self, symbol: str) -> int:
+        """Version of one symbol's bars, unchanged by ingests that only touch other symbols"""
+        self.refresh()
+        return self.index.get(symbol, {}).get('version', 0)
+
+    def _paths(self, symbol: str) -> List[str]:
+        return [os.path.join(self.root, s) for s in self.index.get(symbol, {}).get('segments', [])]
+
+    def get(self, symbol: str) -> pl.DataFrame:
+        """Memory-mapped bars for symbol, empty frame when unknown"""
+        if self.loaded is None:
+            self.open()
+        frame = self.frames.get(symbol)
+        if frame is None:
+            paths = self._paths(symbol)
+            # Polars memory-maps uncompressed IPC files instead of reading them into the heap
+            frame = pl.concat([pl.read_ipc(p) for p in paths], rechunk=False) if paths else pl.DataFrame(schema=SCHEMA)
+            self.frames[symbol] = frame
+        return frame
+
+    def scan(self, symbol: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+             columns: Optional[List[str]] = None) -> pl.LazyFrame:
+        """
+        Lazy view of one symbol's bars, only its segments are read and the time range and columns are pushed down
+
+        Parameters:
+        symbol: Symbol to read
+        start, end: Optional inclusive time range
+        columns: Columns to read, all when None
+        """
+        self.refresh()
+        paths = self._paths(symbol)
+        lf = pl.scan_ipc(paths, glob=False) if paths else pl.LazyFrame(schema=SCHEMA)
+        lf = _time_filter(lf, self.time_col, start, end)
+        if columns is not None:
+            lf = lf.select(columns)
+        return lf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Append bar files to the market data store')
+    parser.add_argument('sources', nargs='*', help='CSV or parquet files with a timestamp, OHLCV and symbol column, '
+                                                   'BARS_SOURCE when none are given')
+    parser.add_argument('--root', default=os.environ.get('STORE_ROOT', 'data'), help='Store directory')
+    parser.add_argument('--time-col', help="Timestamp column, 'date' or 'epoch' by default")
+    parser.add_argument('--rebuild', action='store_true', help='Replace the store instead of appending')
+    args = parser.parse_args()
+    if not args.sources:
+        if not os.environ.get('BARS_SOURCE'):
+            parser.error('give source files or set BARS_SOURCE')
+        args.sources = [os.environ['BARS_SOURCE']]
+
+    store = MarketDataStore(args.root)
+    if args.rebuild:
+        store.build(pl.concat([normalize(scan_source(s), args.time_col) for s in args.sources]))
+        print(f"Rebuilt {args.root}: {len(store.index)} symbols, "
+              f"{sum(e['rows'] for e in store.index.values())} bars, version {store.version}")
+    else:
+        for source in args.sources:
+            start = time.perf_counter()
+            appended = store.ingest(source, time_col=args.time_col)
+            print(f"{source}: {sum(appended.values())} new bars in {len(appended)} symbols "
+                  f"({time.perf_counter() - start:.2f}s), version {store.version}")
@@ -0,0 +1,183 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+import polars as pl
+import talib
+
+# Frame, symbol and data version of the strategy call currently running in this thread
+_bound: ContextVar[Optional[tuple]] = ContextVar('indicator_cache_bound', default=None)
+
+
+def data_version(data: pl.DataFrame) -> int:
+    """Fingerprint of a price frame, changes when bars are edited or appended"""
+    return int(data.hash_rows().sum()) ^ len(data)
+
+
+def _sizeof(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pl.Series, pl.DataFrame)):
+        return value.estimated_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _freeze(value: Any) -> Any:
+    """Mark NumPy results read-only so a strategy can't corrupt a shared cache entry"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+class IndicatorCache:
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        """
+        LRU memo of indicator results bounded by memory use
+
+        Parameters:
+        max_bytes: Memory budget for cached results, least recently used entries are evicted past it
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypasses = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss"""
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+        value = _freeze(compute())
+        size = _sizeof(value)
+        with self._lock:
+            if size > self.max_bytes or key in self.entries:
+                return value
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, old_size) = self.entries.popitem(last=False)
+                self.nbytes -= old_size
+                self.evictions += 1
+        return value
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'bypasses': self.bypasses,
+                    'evictions': self.evictions, 'entries': len(self.entries), 'bytes': self.nbytes,
+                    'max_bytes': self.max_bytes, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+cache = IndicatorCache(max_bytes=int(os.environ.get('INDICATOR_CACHE_MB', 256)) * 2**20)
+
+
+@contextmanager
+def bind(data: pl.DataFrame, symbol: Optional[str], version: Optional[Hashable]):
+    """
+    Scope indicator caching to one strategy call on data
+
+    Parameters:
+    data: Frame passed to the strategy, its raw columns are the cacheable inputs
+    symbol: Symbol the frame holds
+    version: Data version, e.g. from data_version() or a store version and date range
+    """
+    token = _bound.set((data, symbol, version))
+    try:
+        yield
+    finally:
+        _bound.reset(token)
+
+
+def _column_key(bound: tuple, series: pl.Series) -> Optional[tuple]:
+    """
+    Key for a Series that is an unmodified column of the bound frame, None otherwise
+
+    The column is recognised by sharing the bound frame's buffer, compared through zero-copy views so
+    both buffers are alive while their addresses are compared. Anything that would need a copy (several
+    chunks, nulls) is not cached. The key itself is the column name, bind()'s symbol and data version
+    tell frames apart.
+    """
+    data = bound[0]
+    if series.name not in data.columns or len(series) != len(data):
+        return None
+    try:
+        view = series.to_numpy(allow_copy=False)
+        column = data[series.name].to_numpy(allow_copy=False)
+    except Exception:
+        return None
+    return ('col', series.name) if view.ctypes.data == column.ctypes.data else None
+
+
+def cached(name: str, fn: Callable) -> Callable:
+    """
+    Wrap an indicator function so calls inside bind() are memoized
+
+    Calls are cached when every Series argument is a raw column of the bound frame and the
+    remaining arguments are hashable; anything else is computed directly.
+    """
+    def wrapper(*args, **kwargs):
+        bound = _bound.get()
+        if bound is None:
+            return fn(*args, **kwargs)
+        parts = []
+        for arg in list(args) + list(kwargs.values()):
+            if isinstance(arg, pl.Series):
+                part = _column_key(bound, arg)
+            elif isinstance(arg, (int, float, str, bool, type(None))):
+                part = arg
+            else:
+                part = None
+            if part is None and arg is not None:
+                with cache._lock:
+                    cache.bypasses += 1
+                return fn(*args, **kwargs)
+            parts.append(part)
+        key = (bound[1], bound[2], name, tuple(parts), tuple(kwargs))
+        return cache.get_or_compute(key, lambda: fn(*args, **kwargs))
+    wrapper.__name__ = name
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+class _CachedTalib:
+    """Drop-in for the talib module: `from indicator_cache import ta` instead of `import talib as ta`"""
+    def __getattr__(self, name: str) -> Callable:
+        fn = getattr(talib, name)
+        if not callable(fn):
+            return fn
+        wrapped = cached(f'talib.{name}', fn)
+        setattr(self, name, wrapped)
+        return wrapped
+
+
+ta = _CachedTalib()
+
+
+def _rolling_mean(series: pl.Series, window_size: int) -> pl.Series:
+    return series.rolling_mean(window_size=window_size)
+
+
+rolling_mean = cached('rolling_mean', _rolling_mean)
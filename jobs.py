@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from state_store import state
+
+
+class Job:
+    def __init__(self, kind: str, on_change: Callable[['Job'], None] = None):
+        self.id = uuid.uuid4().hex
+        self.on_change = on_change
+        self.kind = kind
+        self.status = 'queued'
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def report(self, **progress) -> None:
+        """Progress callback handed to the job function"""
+        self.progress.update(progress)
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def state(self) -> dict:
+        return {'id': self.id, 'kind': self.kind, 'status': self.status, 'progress': self.progress,
+                'result': self.result, 'error': self.error, 'created': self.created, 'finished': self.finished}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'Job':
+        """Read-only copy of a job running in another process"""
+        job = cls(state['kind'])
+        job.__dict__.update(state)
+        return job
+
+
+class JobManager:
+    def __init__(self, max_workers: int = None, max_jobs: int = 200, store=None):
+        """
+        Run backtests and optimizations off the event loop and keep their state for polling
+
+        Parameters:
+        max_workers: Jobs running at once, defaults to the core count
+        max_jobs: Finished jobs kept for polling, oldest are dropped first
+        store: Optional StateStore that job state is mirrored to, so any web worker can answer a poll
+        """
+        self.store = store
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix='job')
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """Queue fn(*args, progress=job.report, **kwargs) and return its Job immediately"""
+        job = Job(kind, on_change=self._save if self.store is not None else None)
+        job.report()
+        with self._lock:
+            self.jobs[job.id] = job
+            self._trim()
+        self.pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.status = 'running'
+        job.report()
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.status = 'done'
+        except Exception:
+            job.error = traceback.format_exc()
+            job.status = 'error'
+        job.finished = time.time()
+        job.report()
+
+    def _save(self, job: Job) -> None:
+        self.store.set(f'job:{job.id}', job.state())
+
+    def _trim(self) -> None:
+        finished = [k for k, j in self.jobs.items() if j.status in ('done', 'error')]
+        for key in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[key]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            state = self.store.get(f'job:{job_id}')
+            job = Job.from_state(state) if state is not None else None
+        return job
+
+
+jobs = JobManager(max_workers=int(os.environ.get('JOB_WORKERS', 0)) or None, store=state)
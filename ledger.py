@@ -0,0 +1,115 @@
+from typing import Iterable
+
+import numpy as np
+import polars as pl
+
+BUY = 1
+SELL = -1
+
+_COLUMNS = {'bar': np.int64, 'side': np.int8, 'price': np.float64, 'shares': np.float64,
+            'capital': np.float64, 'profit_loss': np.float64, 'cum_profit': np.float64}
+
+
+class TradeLedger:
+    def __init__(self, capacity: int = 64):
+        """
+        Trades kept as typed NumPy columns with a running cumulative P&L
+
+        Columns grow by doubling, so record() is amortized O(1) and nothing is rescanned per trade.
+
+        Parameters:
+        capacity: Initial number of trade slots
+        """
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _COLUMNS.items()}
+        self.count = 0
+        self.total_profit = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sum(col.nbytes for col in self.columns.values())
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.count + extra
+        size = len(self.columns['bar'])
+        if needed <= size:
+            return
+        while size < needed:
+            size *= 2
+        for name, col in self.columns.items():
+            grown = np.zeros(size, dtype=col.dtype)
+            grown[:self.count] = col[:self.count]
+            self.columns[name] = grown
+
+    def record(self, bar: int, side: int, price: float, shares: float, capital: float) -> float:
+        """
+        Append one fill and book its P&L against the previous fill when it reverses it
+
+        Parameters:
+        bar: Row index of the fill in the backtest data
+        side: BUY or SELL
+        price: Fill price
+        shares: Shares bought, or shares held short for a sell
+        capital: Cash after the fill
+
+        Returns:
+        Profit or loss booked by this fill
+        """
+        self._reserve(1)
+        cols, i = self.columns, self.count
+        profit_loss = 0.0
+        if i > 0 and cols['side'][i - 1] != side:
+            profit_loss = (price - cols['price'][i - 1]) * cols['shares'][i - 1] * -side
+        self.total_profit += profit_loss
+        cols['bar'][i] = bar
+        cols['side'][i] = side
+        cols['price'][i] = price
+        cols['shares'][i] = shares
+        cols['capital'][i] = capital
+        cols['profit_loss'][i] = profit_loss
+        cols['cum_profit'][i] = self.total_profit
+        self.count += 1
+        return profit_loss
+
+    def extend(self, bars: Iterable[int], sides: Iterable[int], prices: Iterable[float],
+               shares: Iterable[float], capital: Iterable[float], profit_loss: Iterable[float]) -> None:
+        """Append many fills at once with their P&L already computed, as the vectorized engine produces"""
+        profit_loss = np.asarray(profit_loss, dtype=np.float64)
+        m = len(profit_loss)
+        self._reserve(m)
+        span = slice(self.count, self.count + m)
+        cols = self.columns
+        cols['bar'][span] = bars
+        cols['side'][span] = sides
+        cols['price'][span] = prices
+        cols['shares'][span] = shares
+        cols['capital'][span] = capital
+        cols['profit_loss'][span] = profit_loss
+        cols['cum_profit'][span] = self.total_profit + np.cumsum(profit_loss)
+        self.count += m
+        if m:
+            self.total_profit = float(cols['cum_profit'][self.count - 1])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """View of one column over the recorded trades"""
+        return self.columns[name][:self.count]
+
+    def counts(self) -> dict:
+        """Number of buy and sell fills"""
+        buys = int(np.count_nonzero(self['side'] == BUY))
+        return {'buy': buys, 'sell': self.count - buys}
+
+    def to_frame(self, dates: pl.Series = None) -> pl.DataFrame:
+        """
+        Trades as a Polars frame with the columns the old list of trade dicts had
+
+        Parameters:
+        dates: The backtest's date column, gathered by each trade's bar, the bar index is kept when None
+        """
+        frame = pl.DataFrame({name: self[name] for name in _COLUMNS})
+        frame = frame.with_columns(pl.when(pl.col('side') == BUY).then(pl.lit('buy')).otherwise(pl.lit('sell')).alias('type'))
+        if dates is not None:
+            frame = frame.with_columns(dates.gather(frame['bar']).alias('date'))
+        return frame.select(['date' if dates is not None else 'bar', 'type', 'price', 'shares', 'capital',
+                             'profit_loss', 'cum_profit'])
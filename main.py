@@ -3,24 +3,75 @@ from fastapi import FastAPI, Request, Form, Response
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 import os
 from datetime import datetime
 from typing import Annotated
 import shutil
-from importlib.machinery import SourceFileLoader
-import polars as pl
+import html
+import time
+import uuid
 import pandas as pd
-from backtest import Backtester
+from backtest import Backtester, backtest_universe
+from datastore import MarketDataStore
+from strategy_registry import registry
+from jobs import jobs
+from result_cache import results as result_cache
+from state_store import state
+from telemetry import telemetry
+import indicator_cache
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-df=pl.read_parquet(f'C:\\Users\\{os.getlogin()}\\OneDrive\\Python\\stockdata.parquet')
-#df=pl.read_csv(f'stockdata.csv')
-app.state.it=''
-app.state.df=''
-app.state.fig=''
+# Opened read-only, every uvicorn worker shares it. Bars are added with `python datastore.py FILE`
+# (or BARS_SOURCE), running workers pick the new index up on their next scan
+store=MarketDataStore(os.environ.get('STORE_ROOT', 'data')).open()
+# Per-browser state lives in the shared state store so any uvicorn worker can serve any request
+
+@app.middleware("http")
+async def session(request: Request, call_next):
+    sid = request.cookies.get('sid') or uuid.uuid4().hex
+    request.state.sid = sid
+    response = await call_next(request)
+    if 'sid' not in request.cookies:
+        response.set_cookie('sid', sid, httponly=True, samesite='lax')
+    return response
+
+@app.middleware("http")
+async def timed(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so /jobs/{job_id} is one series, not one per job
+    route = request.scope.get('route')
+    telemetry.observe('http_request_seconds', time.perf_counter() - start, method=request.method,
+                      route=getattr(route, 'path', 'unmatched'), status=response.status_code)
+    return response
+
+def _cache_gauges(name: str, stats: dict):
+    return [(f'{name}_{k}', {}, v) for k, v in stats.items()]
+
+def _collect():
+    yield from _cache_gauges('indicator_cache', indicator_cache.cache.stats())
+    yield from _cache_gauges('result_cache', result_cache.stats())
+    yield 'strategy_registry_loads', {}, registry.loads
+    yield 'strategy_registry_hits', {}, registry.hits
+    statuses = {}
+    for job in list(jobs.jobs.values()):
+        statuses[job.status] = statuses.get(job.status, 0) + 1
+    for status, count in statuses.items():
+        yield 'jobs', {'status': status}, count
+
+telemetry.register(_collect, help={'indicator_cache_hit_rate': 'Indicator cache hits per lookup',
+                                   'result_cache_hit_rate': 'Result cache hits (memory and disk) per lookup',
+                                   'jobs': 'Jobs held by this worker by status'})
+
+def session_get(request: Request, name: str, default=''):
+    return state.get(f'session:{request.state.sid}:{name}', default)
+
+def session_set(request: Request, name: str, value):
+    state.set(f'session:{request.state.sid}:{name}', value)
 
 @app.get("/")
 async def read_root(request:Request):
@@ -31,54 +82,168 @@ async def read_root(request:Request):
     return templates.TemplateResponse(request=request,name="index.html",context={"seq":file_list,"fl":fl})
 
 @app.post("/strategies/{item}")
-async def read_item(item: str):
+async def read_item(request: Request, item: str):
     with open(f'strategies\\{item}') as f:
         fl=f.read()
-    app.state.it=item
+    session_set(request, 'strategy', item)
     return HTMLResponse(f'''<div hx-post="/edit" hx-swap="outerHTML" class="mockup-code strategy w-full">
     <pre><code class="language-python">{fl}</code></pre></div>''')
 
 @app.post("/select/{item}")
-async def read_item(item: str):
+async def read_item(request: Request, item: str):
     with open(f'strategies\\{item}') as f:
         fl=f.read()
-    app.state.it=item
+    session_set(request, 'strategy', item)
     return HTMLResponse(f'''<div>{item}</div>''')
 
 @app.post("/edit")
-async def edit_item():
-    with open(f'strategies\\{app.state.it}') as f:
+async def edit_item(request: Request):
+    item = session_get(request, 'strategy')
+    with open(f'strategies\\{item}') as f:
         fl=f.read()
     return HTMLResponse(f'''<div class="mockup-code strategy flex"><form hx-post="/save/" hx-target=".strategy" hx-swap="outerHTML" class="space-y-4 p-6 w-full">
         <button class="btn btn-sm btn-secondary" hx-post="/run" hx-target="#stats" hx-swap="innerHTML">Run</button>
         <button class="btn btn-sm btn-primary" type="submit">Save</button>
-        <button class="btn btn-sm btn-primary" hx-post="/strategies/{app.state.it}">Cancel</button>
+        <button class="btn btn-sm btn-primary" hx-post="/strategies/{item}">Cancel</button>
         <textarea name="cont" spellcheck="false" class="textarea bg-black w-full" 
         style="white-space: pre; min-height:600px;">{fl}</textarea></form></div>''')
 
 @app.post("/save/")
-async def save_item(cont: str=Form(...)):
-    shutil.copy(f"strategies/{app.state.it}", f"strategies/backups/{app.state.it}.{datetime.now().strftime('%d-%m-%y_%M%S')}")  # Works only in WINDOWS
-    with open(f'strategies\\{app.state.it}','w') as f:
+async def save_item(request: Request, cont: str=Form(...)):
+    item = session_get(request, 'strategy')
+    shutil.copy(f"strategies/{item}", f"strategies/backups/{item}.{datetime.now().strftime('%d-%m-%y_%M%S')}")  # Works only in WINDOWS
+    with open(f'strategies\\{item}','w') as f:
         f.write(cont)
+    registry.invalidate(item)
+    result_cache.drop(strategy=item)
     return HTMLResponse(f'''<div hx-post="/edit" hx-swap="outerHTML" class="mockup-code strategy"><pre>
                         <code class="language-python">{cont}</code></pre></div>''')
 
-@app.post("/run")
-async def run_strategy(symbol: str = Form(...)):
-    print(app.state.it)
-    strategy_name = app.state.it
-    data = df.filter(pl.col('symbol') == symbol)
-    backtester = Backtester(data)
-    my_module = SourceFileLoader(strategy_name, f"strategies/{app.state.it}").load_module()
-    results, app.state.fig = backtester.apply_strategy(my_module.main)
+def parse_date(value: str):
+    return datetime.fromisoformat(value) if value else None
+
+def stats_table(results) -> str:
     stats_df = pd.DataFrame([results])
-    stats_html = stats_df.to_html(justify='left',index=False)    
-    return HTMLResponse(stats_html.replace("\n", ""))
+    stats_html = stats_df.to_html(justify='left',index=False)
+    return stats_html.replace("\n", "")
+
+def load_run(run_id: str, part: str):
+    # In-process LRU first, then the state store shared by all workers
+    value = result_cache.get(f'{run_id}:{part}')
+    if value is None:
+        value = state.get(f'{part}:{run_id}')
+        if value is not None:
+            result_cache.put(f'{run_id}:{part}', value)
+    return value
+
+def save_run(run_id: str, part: str, value, **tags):
+    result_cache.put(f'{run_id}:{part}', value, **tags)
+    state.set(f'{part}:{run_id}', value)
+
+def backtest_job(strategy_name: str, symbol: str, start, end, optimize: bool, progress=None):
+    # Runs on a job worker thread, off the event loop. The figure is only drawn when /fig asks for it
+    version = store.symbol_version(symbol)
+    run_id = result_cache.key(strategy=registry.source_hash(strategy_name), symbol=symbol, start=start, end=end,
+                              optimize=optimize, capital=100000.0, data=version)
+    with telemetry.breakdown() as timings:
+        results = load_run(run_id, 'results')
+        if results is None or load_run(run_id, 'run') is None:
+            telemetry.inc('backtests_total', optimize=optimize)
+            # The range is part of the version, indicator caches and studies are per slice of the symbol
+            backtester = Backtester(store.scan(symbol, start, end), symbol=symbol,
+                                    data_version=(version, start, end))
+            strategy = registry.get(strategy_name)
+            results, _ = backtester.apply_strategy(strategy, optimize=optimize, progress=progress, figure=False)
+            with telemetry.timer('save'):
+                save_run(run_id, 'results', results, strategy=strategy_name, symbol=symbol)
+                save_run(run_id, 'run', backtester.snapshot(), strategy=strategy_name, symbol=symbol)
+        else:
+            telemetry.inc('backtest_cache_hits_total', optimize=optimize)
+    return run_id, results, timings
+
+def figure_json(run_id: str):
+    # Plotly JSON per run, built from the run's snapshot on first request
+    fig = result_cache.get(f'{run_id}:fig')
+    if fig is None:
+        snapshot = load_run(run_id, 'run')
+        if snapshot is None:
+            return None
+        fig = Backtester.from_snapshot(snapshot).figure_json()
+        # Kept in this worker's LRU only, it can be rebuilt from the snapshot and would double the state file
+        result_cache.put(f'{run_id}:fig', fig)
+    return fig
+
+def timings_table(timings: dict) -> str:
+    # Seconds per phase of this request, cached runs only show the lookup
+    cells = ''.join(f'<td>{phase}</td><td>{seconds * 1000:.1f} ms</td>' for phase, seconds in timings.items())
+    return f'<table class="text-xs opacity-60"><tr>{cells}</tr></table>' if timings else ''
+
+def job_status(job) -> str:
+    if job.status == 'done':
+        if isinstance(job.result, str):
+            return job.result
+        run_id, results, timings = job.result
+        # Click the stats to draw this run's figure
+        return (f'<div hx-get="/fig/{run_id}" hx-trigger="click" hx-target="#plots">{stats_table(results)}'
+                f'{timings_table(timings)}</div>')
+    if job.status == 'error':
+        return f'<pre class="text-error">{html.escape(job.error)}</pre>'
+    p = job.progress
+    text = p.get('phase', job.status)
+    if 'n_trials' in p:
+        best = '' if p.get('best_value') is None else f", best {p['best_value']:.2f}"
+        text += f" {p.get('trials', 0)}/{p['n_trials']} trials{best}"
+    if 'total' in p:
+        text += f" {p['done']}/{p['total']} symbols"
+    return f'<div hx-get="/jobs/{job.id}" hx-trigger="load delay:500ms" hx-swap="outerHTML">{text}...</div>'
+
+@app.post("/run")
+async def run_strategy(request: Request, symbol: str = Form(...), start: str = Form(None), end: str = Form(None)):
+    strategy_name = session_get(request, 'strategy')
+    job = jobs.submit('run', backtest_job, strategy_name, symbol, parse_date(start), parse_date(end), False)
+    return HTMLResponse(job_status(job))
+
+def universe_job(strategy_name: str, symbols, start, end, progress=None):
+    table = backtest_universe(store.root, strategy_name, symbols, start, end, progress=progress)
+    return table.to_pandas().to_html(justify='left', index=False).replace("\n", "")
+
+@app.post("/universe")
+async def run_universe(request: Request, symbols: str = Form(None), start: str = Form(None), end: str = Form(None)):
+    # Comma separated symbols, or every symbol in symbols.txt
+    if symbols:
+        universe = [s.strip() for s in symbols.split(',') if s.strip()]
+    else:
+        with open('symbols.txt') as f:
+            universe = [s.strip() for s in f if s.strip()]
+    job = jobs.submit('universe', universe_job, session_get(request, 'strategy'), universe, parse_date(start), parse_date(end))
+    return HTMLResponse(job_status(job))
+
+@app.get("/jobs/{job_id}")
+async def job_progress(request: Request, job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return HTMLResponse('<div>Job not found</div>')
+    if job.status == 'done' and isinstance(job.result, tuple):
+        session_set(request, 'run', job.result[0])
+    return HTMLResponse(job_status(job))
+
+@app.get("/fig/{run_id}")
+async def run_fig(run_id: str):
+    fig = await run_in_threadpool(figure_json, run_id)
+    if fig is None:
+        return HTMLResponse('<div>Run expired, run the backtest again</div>')
+    return HTMLResponse(f'''<div id="fig-{run_id}" class="w-full"></div>
+    <script>(function(f){{Plotly.newPlot('fig-{run_id}', f.data, f.layout, {{responsive: true}});}})({fig});</script>''')
 
 @app.post("/fig")
-async def fig():
-    return HTMLResponse(app.state.fig)
+async def fig(request: Request):
+    # Figure of this session's last run
+    return await run_fig(session_get(request, 'run'))
+
+@app.get("/metrics")
+async def metrics():
+    # Per process, with several uvicorn workers each one is a separate scrape target
+    return Response(telemetry.render(), media_type='text/plain; version=0.0.4')
 
 @app.post("/new")
 async def new_item(filename: str=Form(...)):
@@ -90,27 +255,17 @@ async def new_item(filename: str=Form(...)):
     return HTMLResponse(f'<div hx-post="/edit" hx-swap="outerHTML" class="mockup-code strategy"><pre><code class="language-python">{cont}</code></pre></div>')
 
 @app.post("/loaddata")
-async def edit_item(symbol: str=Form(...)):
-    df1=df.filter(pl.col('symbol')==symbol)
-    app.state.df=df1
+async def edit_item(request: Request, symbol: str=Form(...)):
+    # Bars are memory-mapped by the store, the session only remembers the symbol
+    session_set(request, 'symbol', symbol)
     return symbol
 
 @app.post("/optimize")
-async def run_strategy(symbol: str = Form(...)):
-    print(app.state.it)
-    strategy_name = app.state.it
-    # Filter data by symbol
-    data = df.filter(pl.col('symbol') == symbol)
-    # Instantiate Backtester
-    backtester = Backtester(data)
-    # Load the strategy module
-    my_module = SourceFileLoader(strategy_name, f"strategies/{app.state.it}").load_module()
-    # Apply the strategy
-    results, app.state.fig = backtester.apply_strategy(my_module.main,optimize=True)
-    # Format results for display
-    stats_df = pd.DataFrame([results])
-    stats_html = stats_df.to_html(justify='left',index=False)
-    return HTMLResponse(stats_html.replace("\n", ""))
+async def optimize_strategy(request: Request, symbol: str = Form(...), start: str = Form(None), end: str = Form(None)):
+    strategy_name = session_get(request, 'strategy')
+    # Optimize and backtest on a job worker, htmx polls /jobs/{id} for progress
+    job = jobs.submit('optimize', backtest_job, strategy_name, symbol, parse_date(start), parse_date(end), True)
+    return HTMLResponse(job_status(job))
 
 @app.get('/strategy')
 def page(request:Request):
@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import polars as pl
+
+
+class ReplaySocket:
+    def __init__(self, source: str, speed: Optional[float] = None, ohlc_ticks: bool = False):
+        """
+        Stand-in for websocket.FyersSocket that replays historical bars as ticks
+
+        Parameters:
+        source: CSV or parquet bars with a 'date' or 'epoch' column, OHLCV and 'symbol' (like stockdata.csv)
+        speed: Replay speed multiple of real time, None or 0 replays as fast as possible
+        ohlc_ticks: Emit open/high/low/close as four ticks per bar instead of one close tick
+        """
+        self.source = source
+        self.speed = speed
+        self.ohlc_ticks = ohlc_ticks
+        self.on_message = None
+        self.symbols: List[str] = []
+        self.emitted = 0
+        self.emitted_at: Dict[str, float] = {}
+        self.last_price: Dict[str, float] = {}
+        self.started = None
+        self.finished = None
+        self.task = None
+        self.done = asyncio.Event()
+
+    async def connect(self):
+        pass
+
+    async def subscribe(self, symbols: List[dict]):
+        self.symbols = [s['symbol'] for s in symbols]
+        self.task = asyncio.create_task(self._replay())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def _ticks(self):
+        data = pl.read_csv(self.source, try_parse_dates=True) if self.source.endswith('.csv') \
+            else pl.read_parquet(self.source)
+        time_col = 'date' if 'date' in data.columns else 'epoch'
+        if self.symbols:
+            data = data.filter(pl.col('symbol').is_in(self.symbols))
+        if data[time_col].dtype.is_temporal():
+            data = data.with_columns(pl.col(time_col).dt.epoch('s'))
+        # Running session volume per symbol, like the live feed sends
+        data = data.sort(time_col).with_columns(
+            pl.col('volume').cum_sum().over('symbol', pl.col(time_col) // 86400).alias('volume'))
+        prices = ['open', 'high', 'low', 'close'] if self.ohlc_ticks else ['close']
+        columns = [data[c].to_list() for c in ['symbol', time_col, 'volume'] + prices]
+        for symbol, t, volume, *ltps in zip(*columns):
+            for ltp in ltps:
+                yield {'symbol': symbol, 'timestamp': t, 'ltp': ltp, 'volume': volume}
+
+    async def _replay(self):
+        self.started = time.perf_counter()
+        first_ts = None
+        for message in self._ticks():
+            if self.speed:
+                if first_ts is None:
+                    first_ts = message['timestamp']
+                delay = (message['timestamp'] - first_ts) / self.speed - (time.perf_counter() - self.started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.last_price[message['symbol']] = message['ltp']
+            self.emitted_at[message['symbol']] = time.perf_counter()
+            self.on_message(message)
+            self.emitted += 1
+            # Let order tasks scheduled by the callback run before the next tick
+            await asyncio.sleep(0)
+        self.finished = time.perf_counter()
+        self.done.set()
+
+    def ticks_per_second(self) -> float:
+        end = self.finished or time.perf_counter()
+        return self.emitted / (end - self.started) if self.started else 0.0
+
+
+class ReplayBroker:
+    def __init__(self, feed: ReplaySocket, capital: float = 1000000.0):
+        """
+        Stand-in for fyersModel.FyersModel that fills market orders at the last replayed price
+
+        Parameters:
+        feed: The ReplaySocket driving the session, used for fill prices and latency
+        capital: Starting cash reported by get_funds
+        """
+        self.feed = feed
+        self.cash = capital
+        self.positions: Dict[str, float] = {}
+        self.fills: List[dict] = []
+
+    def get_funds(self) -> dict:
+        return {'s': 'ok', 'fund_limit': [{'equityAmount': self.cash}]}
+
+    def place_order(self, params: dict) -> dict:
+        symbol = params['symbol']
+        price = self.feed.last_price[symbol]
+        qty = params['qty'] * params['side']
+        self.cash -= qty * price
+        self.positions[symbol] = self.positions.get(symbol, 0) + qty
+        order_id = str(len(self.fills) + 1)
+        self.fills.append({'id': order_id, 'symbol': symbol, 'qty': qty, 'price': price,
+                           'latency': time.perf_counter() - self.feed.emitted_at[symbol]})
+        return {'s': 'ok', 'id': order_id}
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        """Signal-to-order latency in milliseconds, from tick emission to place_order"""
+        if not self.fills:
+            return {}
+        lat = np.array([f['latency'] for f in self.fills]) * 1000
+        return {'p50': float(np.percentile(lat, 50)), 'p95': float(np.percentile(lat, 95)),
+                'p99': float(np.percentile(lat, 99)), 'max': float(lat.max())}
+
+
+async def run_replay(source: str, config: dict, speed: Optional[float] = None, ohlc_ticks: bool = False) -> dict:
+    """
+    Drive FyersRealTimeTrading against a replayed feed and report throughput and fills
+
+    Parameters:
+    source: Bars file to replay
+    config: Trading config as for fyers_config.json (symbols, risk_per_trade, fast_ma, slow_ma, ...)
+    speed: Replay speed multiple, None for as fast as possible
+    ohlc_ticks: Emit four ticks per bar
+    """
+    from claude import FyersRealTimeTrading
+    feed = ReplaySocket(source, speed=speed, ohlc_ticks=ohlc_ticks)
+    broker = ReplayBroker(feed)
+    trader = FyersRealTimeTrading(config=config, fyers=broker, ws=feed)
+    await trader.connect_websocket()
+    await feed.done.wait()
+    # Orders scheduled by the last ticks
+    await asyncio.gather(*trader.pending_orders)
+    return {'ticks': feed.emitted, 'ticks_per_second': feed.ticks_per_second(), 'fills': len(broker.fills),
+            'latency_ms': broker.latency_percentiles(), 'cash': broker.cash, 'positions': broker.positions}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay historical bars through FyersRealTimeTrading')
+    parser.add_argument('source', nargs='?', default='stockdata.csv')
+    parser.add_argument('--symbols', default='HDFCBANK,SBIN,TCS')
+    parser.add_argument('--speed', type=float, default=0, help='Multiple of real time, 0 for as fast as possible')
+    parser.add_argument('--ohlc', action='store_true', help='Four ticks per bar')
+    parser.add_argument('--strategy', help='Run a strategies/*.py file on completed bars')
+    parser.add_argument('--bar-interval', default='1d')
+    args = parser.parse_args()
+    config = {'symbols': args.symbols.split(','), 'risk_per_trade': 0.02, 'fast_ma': 20, 'slow_ma': 50}
+    if args.strategy:
+        config.update(strategy=args.strategy, bar_interval=args.bar_interval)
+    print(asyncio.run(run_replay(args.source, config, speed=args.speed or None, ohlc_ticks=args.ohlc)))
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def _sizeof(value: Any) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value.values())
+    if hasattr(value, 'estimated_size'):
+        # Polars frames and series
+        return value.estimated_size()
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 64 * 2**20, disk_dir: str = None, max_disk_bytes: int = 512 * 2**20):
+        """
+        Backtest results (metrics and rendered figure) keyed by a hash of everything that produced them
+
+        Parameters:
+        max_bytes: In-memory budget, least recently used entries are evicted past it
+        disk_dir: Optional directory for a second, larger pickle tier
+        max_disk_bytes: Disk budget, least recently read files are removed past it
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.tags: Dict[str, dict] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(**parts) -> str:
+        """Content address of a run, e.g. key(strategy=source_hash, symbol=..., params=..., data=version)"""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f'{key}.pkl')
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            path = self._disk_path(key)
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+            with self._lock:
+                self.disk_hits += 1
+            self._put_memory(key, value)
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any, **tags) -> None:
+        """
+        Store value under key
+
+        Parameters:
+        tags: Labels such as strategy='macd.py', symbol='SBIN' that drop() can match on
+        """
+        with self._lock:
+            self.tags[key] = tags
+        self._put_memory(key, value)
+        if self.disk_dir:
+            tmp = self._disk_path(key) + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._disk_path(key))
+            self._trim_disk()
+
+    def _put_memory(self, key: str, value: Any) -> None:
+        size = _sizeof(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                old_key, (_, old_size) = self.entries.popitem(last=False)
+                self.nbytes -= old_size
+                if not self.disk_dir:
+                    self.tags.pop(old_key, None)
+
+    def _trim_disk(self) -> None:
+        files = [os.path.join(self.disk_dir, f) for f in os.listdir(self.disk_dir) if f.endswith('.pkl')]
+        stats = sorted(((os.path.getmtime(f), os.path.getsize(f), f) for f in files))
+        total = sum(s for _, s, _ in stats)
+        for _, size, path in stats:
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def drop(self, **tags) -> int:
+        """Remove entries whose tags match, e.g. drop(strategy='macd.py') after the file is saved"""
+        with self._lock:
+            keys = [k for k, t in self.tags.items() if all(t.get(name) == v for name, v in tags.items())]
+            for key in keys:
+                del self.tags[key]
+                if key in self.entries:
+                    self.nbytes -= self.entries.pop(key)[1]
+        if self.disk_dir:
+            for key in keys:
+                if os.path.exists(self._disk_path(key)):
+                    os.remove(self._disk_path(key))
+        return len(keys)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'entries': len(self.entries), 'bytes': self.nbytes,
+                    'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0}
+
+
+results = ResultCache(max_bytes=int(os.environ.get('RESULT_CACHE_MB', 64)) * 2**20,
+                      disk_dir=os.environ.get('RESULT_CACHE_DIR') or None,
+                      max_disk_bytes=int(os.environ.get('RESULT_CACHE_DISK_MB', 512)) * 2**20)
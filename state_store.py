@@ -0,0 +1,81 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+
+class StateStore:
+    def __init__(self, path: str = 'state.db', ttl: float = 24 * 3600, purge_every: int = 200,
+                 max_bytes: int = 512 * 2**20):
+        """
+        Key/value state with TTL eviction in SQLite, shared by every uvicorn worker on the machine
+
+        Parameters:
+        path: SQLite file, all workers must point at the same one
+        ttl: Default seconds an entry lives after it is written
+        purge_every: Writes between sweeps that delete expired rows and enforce max_bytes
+        max_bytes: Budget for stored values, the entries closest to expiry are deleted past it
+        """
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.max_bytes = max_bytes
+        self.writes = 0
+        self._local = threading.local()
+        db = self._connect()
+        # Freed pages go back to the OS on purge() instead of the file only ever growing
+        if db.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            # Only takes effect on a new file or after a full VACUUM, once per older file
+            db.execute('VACUUM')
+        db.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, WAL lets readers in other processes run during a write
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._connect().execute('SELECT value, expires FROM state WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store value under key, replacing any previous value
+
+        Parameters:
+        ttl: Seconds to keep it, the store default when None
+        """
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self._connect().execute('INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)',
+                                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires))
+        self.writes += 1
+        if self.writes % self.purge_every == 0:
+            self.purge()
+
+    def delete(self, key: str) -> None:
+        self._connect().execute('DELETE FROM state WHERE key = ?', (key,))
+
+    def purge(self) -> int:
+        """Delete expired entries and the oldest ones past max_bytes, then release the freed pages"""
+        db = self._connect()
+        removed = db.execute('DELETE FROM state WHERE expires < ?', (time.time(),)).rowcount
+        # Keep the entries that expire last while their running size fits the budget
+        removed += db.execute('DELETE FROM state WHERE key IN (SELECT key FROM (SELECT key, SUM(LENGTH(value)) '
+                              'OVER (ORDER BY expires DESC) AS kept FROM state) WHERE kept > ?)',
+                              (self.max_bytes,)).rowcount
+        db.execute('PRAGMA incremental_vacuum')
+        return removed
+
+
+state = StateStore(os.environ.get('STATE_DB', 'state.db'), ttl=float(os.environ.get('STATE_TTL_HOURS', 24)) * 3600,
+                   max_bytes=int(os.environ.get('STATE_MAX_MB', 512)) * 2**20)
@@ -1,27 +1,31 @@
 import polars as pl
-import talib as ta
+from indicator_cache import ta
 from typing import List
 
-def main(data: pl.DataFrame, short_window: int = 30, long_window: int = 100) -> List[int]:
+# Search space for the optimizer, see backtest.search_space
+PARAMS = {'short_window': (10, 50), 'long_window': (50, 200), 'signal_window': (3, 20)}
+
+def main(data: pl.DataFrame, short_window: int = 30, long_window: int = 100, signal_window: int = 6) -> List[int]:
     """
-    Example strategy using moving average crossover
+    Example strategy using MACD signal line crossover
     Parameters:
     data: Price data DataFrame
-    short_window: Short-term moving average period
-    long_window: Long-term moving average period
+    short_window: Fast EMA period
+    long_window: Slow EMA period
+    signal_window: Signal line EMA period
     
     Returns:
     List of position signals
     """
-    macd, sig, hist = ta.MACD(data['close'],fastperiod=30,slowperiod=100,signalperiod=6,)
+    macd, sig, hist = ta.MACD(data['close'],fastperiod=short_window,slowperiod=long_window,signalperiod=signal_window)
     macd=macd.to_list()
     sig=sig.to_list()
     
     signals = [0] * len(data)
     
     
-    # Generate signals
-    for i in range(long_window, len(data)):
+    # Generate signals, acted on at the next bar
+    for i in range(long_window, len(data) - 1):
         if (macd[i] > sig[i] and 
             macd[i-1] < sig[i-1]):
             signals[i+1] = 1  # Buy signal
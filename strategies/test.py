@@ -1,7 +1,11 @@
 import polars as pl
 import talib as ta
+from indicator_cache import rolling_mean
 from typing import List
 
+# Search space for the optimizer, see backtest.search_space
+PARAMS = {'short_window': (10, 50), 'long_window': (50, 200)}
+
 def main(data: pl.DataFrame, short_window: int = 30, long_window: int = 100) -> List[int]:
     """
     Example strategy using moving average crossover
@@ -24,8 +28,8 @@ def main(data: pl.DataFrame, short_window: int = 30, long_window: int = 100) ->
     signals = [0] * len(data)
     
     # Calculate moving averages using Polars
-    short_ma = data.select([pl.col("close").rolling_mean(window_size=short_window)]).to_series()
-    long_ma = data.select([pl.col("close").rolling_mean(window_size=long_window)]).to_series()
+    short_ma = rolling_mean(data['close'], short_window)
+    long_ma = rolling_mean(data['close'], long_window)
     #short_ma = data.select([pl.col("close").ewm_mean(min_periods=short_window,span=short_window)]).to_series()
     #long_ma = data.select([pl.col("close").ewm_mean(min_periods=long_window,span=long_window)]).to_series()
     
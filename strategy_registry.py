@@ -0,0 +1,69 @@
+import hashlib
+import importlib.util
+import os
+import threading
+from typing import Callable, Dict, List
+
+from telemetry import telemetry
+
+
+class StrategyRegistry:
+    def __init__(self, directory: str = 'strategies'):
+        """
+        Cache of compiled strategy modules, reloaded only when the file changes on disk
+
+        Parameters:
+        directory: Folder holding the strategy files
+        """
+        self.directory = directory
+        self.modules: Dict[str, tuple] = {}
+        self.loads = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _stamp(self, path: str) -> tuple:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self, name: str):
+        """Return the module for strategy file name, compiling it only on first use or after a change"""
+        path = self.path(name)
+        stamp = self._stamp(path)
+        with self._lock:
+            cached = self.modules.get(name)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                return cached[1]
+        with open(path, 'rb') as f:
+            source = f.read()
+        with telemetry.timer('strategy_compile'):
+            spec = importlib.util.spec_from_file_location(os.path.splitext(name)[0], path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        module.__source_hash__ = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            self.modules[name] = (stamp, module)
+            self.loads += 1
+        return module
+
+    def get(self, name: str) -> Callable:
+        """Cached main() of strategy file name"""
+        return self.load(name).main
+
+    def source_hash(self, name: str) -> str:
+        """SHA-256 of the strategy source currently loaded"""
+        return self.load(name).__source_hash__
+
+    def invalidate(self, name: str) -> None:
+        """Drop the cached module, e.g. after /save/ rewrote the file"""
+        with self._lock:
+            self.modules.pop(name, None)
+
+    def names(self) -> List[str]:
+        return [f for f in os.listdir(self.directory) if os.path.isfile(self.path(f))]
+
+
+registry = StrategyRegistry()
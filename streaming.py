@@ -0,0 +1,279 @@
+import math
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import polars as pl
+
+
+class SMA:
+    def __init__(self, period: int):
+        """
+        Simple moving average updated in O(1) per value, matches talib.SMA
+
+        Parameters:
+        period: Window length
+        """
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        """Add one value, returns the average once period values have been seen, else None"""
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+        if len(self.window) == self.period:
+            self.value = self.total / self.period
+        return self.value
+
+
+class EMA:
+    def __init__(self, period: int, seed_skip: int = 0):
+        """
+        Exponential moving average seeded with the SMA of its first period values, matches talib.EMA
+
+        Parameters:
+        period: Smoothing period, k = 2 / (period + 1)
+        seed_skip: Values to ignore before the seed window starts (used by MACD to align with TA-Lib)
+        """
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.skip = seed_skip
+        self.seed = SMA(period)
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        if self.skip:
+            self.skip -= 1
+        elif self.value is None:
+            self.value = self.seed.update(x)
+        else:
+            self.value = (x - self.value) * self.k + self.value
+        return self.value
+
+
+class MACD:
+    def __init__(self, fastperiod: int = 12, slowperiod: int = 26, signalperiod: int = 9):
+        """
+        MACD line, signal and histogram, matches talib.MACD
+
+        TA-Lib seeds the fast EMA on the fastperiod values that end where the slow EMA's seed ends,
+        so both lines start on the same bar; the fast EMA skips the values before that window.
+        """
+        if slowperiod < fastperiod:
+            fastperiod, slowperiod = slowperiod, fastperiod
+        self.fast = EMA(fastperiod, seed_skip=slowperiod - fastperiod)
+        self.slow = EMA(slowperiod)
+        self.signal = EMA(signalperiod)
+        self.value: Optional[tuple] = None
+
+    def update(self, x: float) -> Optional[tuple]:
+        """Returns (macd, signal, hist) once the signal line is warm, else None"""
+        fast = self.fast.update(x)
+        slow = self.slow.update(x)
+        if fast is None or slow is None:
+            return None
+        macd = fast - slow
+        sig = self.signal.update(macd)
+        if sig is not None:
+            self.value = (macd, sig, macd - sig)
+        return self.value
+
+
+class RSI:
+    def __init__(self, period: int = 14):
+        """Relative strength index with Wilder smoothing, matches talib.RSI"""
+        self.period = period
+        self.prev: Optional[float] = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        if self.prev is None:
+            self.prev = x
+            return None
+        change, self.prev = x - self.prev, x
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        self.count += 1
+        if self.count <= self.period:
+            # Seed averages are plain means of the first period changes
+            self.gain += gain
+            self.loss += loss
+            if self.count < self.period:
+                return None
+            self.gain /= self.period
+            self.loss /= self.period
+        else:
+            self.gain = (self.gain * (self.period - 1) + gain) / self.period
+            self.loss = (self.loss * (self.period - 1) + loss) / self.period
+        total = self.gain + self.loss
+        self.value = 100.0 * self.gain / total if total != 0 else 0.0
+        return self.value
+
+
+class CrossOver:
+    def __init__(self):
+        """Detects when series a crosses series b, same rule as strategies/test.py"""
+        self.prev: Optional[tuple] = None
+
+    def update(self, a: Optional[float], b: Optional[float]) -> int:
+        """Returns 1 when a crosses above b, -1 when it crosses below, 0 otherwise"""
+        if a is None or b is None or math.isnan(a) or math.isnan(b):
+            return 0
+        prev, self.prev = self.prev, (a, b)
+        if prev is None:
+            return 0
+        if a > b and prev[0] <= prev[1]:
+            return 1
+        if a < b and prev[0] >= prev[1]:
+            return -1
+        return 0
+
+
+class MACrossover:
+    def __init__(self, fast: int, slow: int):
+        """Dual SMA crossover signal for the live tick path"""
+        self.fast = SMA(fast)
+        self.slow = SMA(slow)
+        self.cross = CrossOver()
+
+    def update(self, price: float) -> int:
+        return self.cross.update(self.fast.update(price), self.slow.update(price))
+
+
+class TickBuffer:
+    def __init__(self, capacity: int = 1000):
+        """
+        Fixed-size tick history in preallocated NumPy columns
+
+        Every value is written twice, at i and i + capacity, so the last n ticks are always one
+        contiguous slice: appends are O(1) and windows are views, never copies.
+
+        Parameters:
+        capacity: Ticks kept per symbol
+        """
+        self.capacity = capacity
+        self.timestamps = np.zeros(2 * capacity)
+        self.prices = np.zeros(2 * capacity)
+        self.volumes = np.zeros(2 * capacity)
+        self.count = 0
+
+    def append(self, timestamp: float, price: float, volume: float) -> None:
+        i = self.count % self.capacity
+        j = i + self.capacity
+        self.timestamps[i] = self.timestamps[j] = timestamp
+        self.prices[i] = self.prices[j] = price
+        self.volumes[i] = self.volumes[j] = volume
+        self.count += 1
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def _span(self, n: Optional[int]) -> slice:
+        end = (self.count - 1) % self.capacity + self.capacity + 1 if self.count else 0
+        n = len(self) if n is None else min(n, len(self))
+        return slice(end - n, end)
+
+    def window(self, n: int = None) -> tuple:
+        """Zero-copy (timestamps, prices, volumes) views of the last n ticks, oldest first"""
+        span = self._span(n)
+        return self.timestamps[span], self.prices[span], self.volumes[span]
+
+    @property
+    def last_price(self) -> float:
+        if not self.count:
+            raise IndexError("TickBuffer is empty")
+        return float(self.prices[(self.count - 1) % self.capacity])
+
+    @property
+    def last_timestamp(self) -> float:
+        if not self.count:
+            raise IndexError("TickBuffer is empty")
+        return float(self.timestamps[(self.count - 1) % self.capacity])
+
+
+INTERVALS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+
+
+class BarAggregator:
+    def __init__(self, interval: str = '1m', utc_offset: int = 19800, cumulative_volume: bool = True):
+        """
+        Folds ticks into OHLCV bars as they arrive
+
+        Parameters:
+        interval: Bar size, one of INTERVALS ('1m', '5m', '15m', '1h', '1d')
+        utc_offset: Seconds added to epoch timestamps before bucketing, IST by default so daily bars
+                    close at local midnight
+        cumulative_volume: Tick volume is the day's running total (as the Fyers feed sends), so a bar's
+                           volume is the difference between its last and the previous bar's last total
+        """
+        self.interval = INTERVALS[interval]
+        self.utc_offset = utc_offset
+        self.cumulative_volume = cumulative_volume
+        self.bucket = None
+        self.bar = None
+        self.last_total = None
+
+    def update(self, timestamp: float, price: float, volume: float) -> Optional[dict]:
+        """Add one tick, returns the bar it closed when the tick starts a new bucket, else None"""
+        bucket = (int(timestamp) + self.utc_offset) // self.interval
+        closed = None
+        if self.bucket is not None and bucket != self.bucket:
+            closed = self.flush()
+        if self.bar is None:
+            self.bucket = bucket
+            self.bar = {'date': bucket * self.interval - self.utc_offset, 'open': price, 'high': price,
+                        'low': price, 'close': price, 'volume': 0.0}
+        bar = self.bar
+        if price > bar['high']:
+            bar['high'] = price
+        if price < bar['low']:
+            bar['low'] = price
+        bar['close'] = price
+        if self.cumulative_volume:
+            if self.last_total is not None:
+                # The running total restarts each session
+                bar['volume'] += volume - self.last_total if volume >= self.last_total else volume
+            self.last_total = volume
+        else:
+            bar['volume'] += volume
+        return closed
+
+    def flush(self) -> Optional[dict]:
+        """Close and return the bar in progress"""
+        bar, self.bar = self.bar, None
+        return bar
+
+
+class BarHistory:
+    def __init__(self, capacity: int = 5000):
+        """
+        Completed bars in preallocated NumPy columns, exposed as the frame strategies/*.py expect
+
+        Parameters:
+        capacity: Bars kept, the oldest are dropped once full
+        """
+        self.capacity = capacity
+        self.columns = {c: np.zeros(2 * capacity) for c in ['date', 'open', 'high', 'low', 'close', 'volume']}
+        self.count = 0
+
+    def append(self, bar: dict) -> None:
+        i = self.count % self.capacity
+        for name, col in self.columns.items():
+            col[i] = col[i + self.capacity] = bar[name]
+        self.count += 1
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def frame(self) -> pl.DataFrame:
+        """Bars oldest first with a datetime 'date' column"""
+        end = (self.count - 1) % self.capacity + self.capacity + 1 if self.count else 0
+        span = slice(end - len(self), end)
+        data = pl.DataFrame({name: col[span] for name, col in self.columns.items()})
+        return data.with_columns(pl.from_epoch(pl.col('date').cast(pl.Int64), time_unit='s'))
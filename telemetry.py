@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds in seconds, from hot-path lookups to full optimizations
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Phase timings of the run in progress on this thread, bound by Telemetry.breakdown()
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar('breakdown', default=None)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Telemetry:
+    def __init__(self, prefix: str = 'algo'):
+        """
+        In-process timers, counters and histograms rendered in Prometheus text format
+
+        Parameters:
+        prefix: Prepended to every metric name
+        """
+        self.prefix = prefix
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.help: Dict[str, str] = {}
+        self.collectors: List[Callable[[], Iterable[tuple]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, phase: str, **labels):
+        """
+        Time a block into the phase_seconds histogram and the breakdown of the current run, if any
+
+        Parameters:
+        phase: Phase name, e.g. 'signals', 'simulate', 'figure'
+        labels: Extra labels such as strategy or engine
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('phase_seconds', elapsed, phase=phase, **labels)
+            timings = _breakdown.get()
+            if timings is not None:
+                timings[phase] = timings.get(phase, 0.0) + elapsed
+
+    @contextmanager
+    def breakdown(self):
+        """Collect the phase timings of one run, yields the dict phase -> seconds that timer() fills"""
+        timings: Dict[str, float] = {}
+        token = _breakdown.set(timings)
+        try:
+            yield timings
+        finally:
+            _breakdown.reset(token)
+
+    def register(self, collector: Callable[[], Iterable[tuple]], help: Dict[str, str] = None) -> None:
+        """
+        Add a callable polled at scrape time for gauges, e.g. cache statistics
+
+        Parameters:
+        collector: Returns (name, labels dict, value) tuples
+        help: Optional help text per metric name
+        """
+        self.collectors.append(collector)
+        self.help.update(help or {})
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted((k, (list(h.counts), h.sum, h.count, h.buckets)) for k, h in self.histograms.items())
+            counters = sorted(self.counters.items())
+        typed = set()
+
+        def header(name, kind):
+            full = f'{self.prefix}_{name}'
+            if full not in typed:
+                typed.add(full)
+                if name in self.help:
+                    lines.append(f'# HELP {full} {self.help[name]}')
+                lines.append(f'# TYPE {full} {kind}')
+            return full
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            full = header(name, 'histogram')
+            labels = dict(labels)
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += n
+                lines.append(f'{full}_bucket{_labels({**labels, "le": bound})} {cumulative}')
+            lines.append(f'{full}_sum{_labels(labels)} {total}')
+            lines.append(f'{full}_count{_labels(labels)} {count}')
+        for (name, labels), value in counters:
+            full = header(name, 'counter')
+            lines.append(f'{full}{_labels(dict(labels))} {value}')
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                full = header(name, 'gauge')
+                lines.append(f'{full}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+telemetry = Telemetry(os.environ.get('METRICS_PREFIX', 'algo'))
+telemetry.help.update({
+    'phase_seconds': 'Wall time of backtest phases',
+    'http_request_seconds': 'Wall time of HTTP requests by route',
+})
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Strategies and data files are looked up relative to the repo root, as when the app runs
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def bars():
+    from benchmark import synthetic_ohlcv
+    return synthetic_ohlcv(20_000, seed=7)
@@ -0,0 +1,34 @@
+import polars as pl
+import pytest
+
+from backtest import Backtester, backtest_chunked
+from benchmark import synthetic_ohlcv
+from strategy_registry import registry
+
+
+def test_chunked_matches_run():
+    data = synthetic_ohlcv(200_000, seed=3)
+    strategy = registry.get('macd.py')
+    expected = Backtester(data).run(strategy)
+    result = backtest_chunked(data.lazy(), strategy, chunk_size=7_000, sort=False)
+    assert result['Num Trades'] == expected['Num Trades']
+    assert result == pytest.approx(expected, rel=1e-9)
+
+
+def test_chunked_picks_one_symbol_from_stockdata():
+    strategy = registry.get('macd.py')
+    source = pl.scan_csv('stockdata.csv')
+    bars = pl.read_csv('stockdata.csv').filter(pl.col('symbol') == 'SBIN').with_columns(
+        pl.col('epoch').str.to_datetime().alias('date'))
+    expected = Backtester(bars).run(strategy)
+    result = backtest_chunked(source, strategy, chunk_size=300, symbol='SBIN')
+    assert result == pytest.approx(expected, rel=1e-9)
+
+    with pytest.raises(ValueError, match='several symbols'):
+        backtest_chunked(source, strategy, chunk_size=300)
+
+
+def test_chunked_rejects_unsorted_bars_when_not_sorting(bars):
+    shuffled = pl.concat([bars.tail(1_000), bars.head(len(bars) - 1_000)])
+    with pytest.raises(ValueError, match='sorted by date'):
+        backtest_chunked(shuffled.lazy(), registry.get('macd.py'), chunk_size=5_000, sort=False)
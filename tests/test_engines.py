@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from polars.testing import assert_frame_equal
+
+from backtest import Backtester
+from strategy_registry import registry
+
+
+def _run(data, signals, engine):
+    backtester = Backtester(data)
+    backtester.simulate(list(signals), engine)
+    return backtester.metrics(), backtester.trades.to_frame(backtester.data['date']), \
+        np.asarray(backtester.portfolio_values, dtype=np.float64)
+
+
+def _assert_engines_match(data, signals):
+    loop_metrics, loop_trades, loop_values = _run(data, signals, 'loop')
+    vec_metrics, vec_trades, vec_values = _run(data, signals, 'vector')
+    assert vec_metrics == pytest.approx(loop_metrics, nan_ok=True)
+    assert_frame_equal(vec_trades, loop_trades, check_dtypes=False)
+    np.testing.assert_allclose(vec_values, loop_values)
+
+
+@pytest.mark.parametrize('pattern', [
+    [1, 0, 0, -1, 0, 1, 0, -1],        # long, exit, long, exit
+    [-1, 0, 0, 1, 0, -1, 0, 1],        # short first, then alternate
+    [0] * 8,                           # flat, no trades
+    [1, 1, 1, 0, 0, 0, 0, 0],          # repeated signals are not new trades
+    [-1, -1, 0, -1, 1, 1, -1, 0],      # repeated shorts then reversals
+])
+def test_engines_match_on_long_short_and_flat(bars, pattern):
+    data = bars.head(400)
+    signals = np.tile(pattern, len(data) // len(pattern) + 1)[:len(data)]
+    _assert_engines_match(data, signals)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_engines_match_on_random_signals(bars, seed):
+    rng = np.random.default_rng(seed)
+    data = bars.head(2_000)
+    signals = rng.choice([-1, 0, 0, 0, 1], size=len(data))
+    _assert_engines_match(data, signals)
+
+
+@pytest.mark.parametrize('name', ['macd.py', 'test.py'])
+def test_engines_match_on_strategies(bars, name):
+    data = bars.head(5_000)
+    _assert_engines_match(data, registry.get(name)(data))
+
+
+def test_grid_search_matches_single_runs(bars):
+    data = bars.head(3_000)
+    strategy = registry.get('macd.py')
+    grid = {'short_window': [10, 20, 30], 'long_window': [60, 100], 'signal_window': [6, 9]}
+    table = Backtester(data).grid_search(strategy, grid, chunk_size=5)
+    assert len(table) == 12
+    for row in table.iter_rows(named=True):
+        params = {name: row[name] for name in grid}
+        expected = Backtester(data).run(strategy, **params)
+        assert row['Total Return'] == pytest.approx(expected['Total Return'])
+        assert row['Num Trades'] == expected['Num Trades']
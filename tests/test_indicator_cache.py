@@ -0,0 +1,50 @@
+import numpy as np
+import optuna
+import polars as pl
+
+import indicator_cache
+from backtest import Backtester
+from strategy_registry import registry
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+
+def _fresh_cache():
+    indicator_cache.cache.clear()
+    indicator_cache.cache.hits = indicator_cache.cache.misses = indicator_cache.cache.bypasses = 0
+
+
+def test_column_key_only_matches_the_bound_column():
+    data = pl.DataFrame({'close': np.arange(100.0), 'open': np.arange(100.0)})
+    with indicator_cache.bind(data, 'X', 1):
+        bound = indicator_cache._bound.get()
+        assert indicator_cache._column_key(bound, data['close']) == ('col', 'close')
+        # Same values in another buffer, or the same name from another frame, are not the bound column
+        assert indicator_cache._column_key(bound, pl.Series('close', np.arange(100.0))) is None
+        assert indicator_cache._column_key(bound, data['open'].alias('close')) is None
+        assert indicator_cache._column_key(bound, data['close'] * 2) is None
+
+
+def test_multi_chunk_columns_are_not_keyed():
+    part = pl.DataFrame({'close': np.arange(50.0)})
+    data = pl.concat([part, part], rechunk=False)
+    with indicator_cache.bind(data, 'X', 1):
+        assert indicator_cache._column_key(indicator_cache._bound.get(), data['close']) is None
+
+
+def test_cached_result_matches_direct_call(bars):
+    backtester = Backtester(bars, symbol='SYN')
+    _fresh_cache()
+    first = backtester._signals(registry.get('test.py'), short_window=12, long_window=60)
+    again = backtester._signals(registry.get('test.py'), short_window=12, long_window=60)
+    assert first == again == registry.get('test.py')(bars, short_window=12, long_window=60)
+    assert indicator_cache.cache.hits == 2
+
+
+def test_optimizer_trials_share_the_cache(bars):
+    _fresh_cache()
+    Backtester(bars, symbol='SYN').optimize_strategy(registry.get('test.py'), n_trials=20, n_jobs=1,
+                                                     storage=None, seed=1)
+    stats = indicator_cache.cache.stats()
+    assert stats['hits'] > 0
+    assert stats['bypasses'] == 0
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import talib
+
+from streaming import EMA, MACD, RSI, SMA
+
+
+def _stream(indicator, values):
+    out = []
+    for x in values:
+        v = indicator.update(float(x))
+        out.append(np.nan if v is None else v)
+    return np.array(out)
+
+
+@pytest.fixture
+def close(bars):
+    return bars['close'].to_numpy()[:5_000]
+
+
+def _assert_matches(streamed, expected):
+    # Same warm-up bars, then agreement to float rounding
+    np.testing.assert_array_equal(np.isnan(streamed), np.isnan(expected))
+    np.testing.assert_allclose(streamed, expected, rtol=1e-13, atol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize('period', [2, 14, 200])
+def test_sma_matches_talib(close, period):
+    _assert_matches(_stream(SMA(period), close), talib.SMA(close, timeperiod=period))
+
+
+@pytest.mark.parametrize('period', [2, 14, 200])
+def test_ema_matches_talib(close, period):
+    _assert_matches(_stream(EMA(period), close), talib.EMA(close, timeperiod=period))
+
+
+@pytest.mark.parametrize('periods', [(12, 26, 9), (5, 35, 5), (30, 100, 6)])
+def test_macd_matches_talib(close, periods):
+    expected = talib.MACD(close, *periods)
+    streamed = MACD(*periods)
+    rows = [streamed.update(float(x)) for x in close]
+    for column, exp in enumerate(expected):
+        _assert_matches(np.array([np.nan if r is None else r[column] for r in rows]), exp)
+
+
+@pytest.mark.parametrize('period', [2, 14, 50])
+def test_rsi_matches_talib(close, period):
+    _assert_matches(_stream(RSI(period), close), talib.RSI(close, timeperiod=period))
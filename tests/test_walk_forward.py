@@ -0,0 +1,26 @@
+import optuna
+
+import indicator_cache
+from backtest import Backtester, walk_forward_folds
+from strategy_registry import registry
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+
+def test_folds_tile_the_history():
+    folds = walk_forward_folds(1000, 400, 200)
+    assert [(f[2], f[3]) for f in folds] == [(400, 600), (600, 800), (800, 1000)]
+    assert all(f[1] == f[2] for f in folds)
+
+
+def test_fold_searches_reuse_the_indicator_cache(bars):
+    indicator_cache.cache.clear()
+    indicator_cache.cache.hits = indicator_cache.cache.misses = indicator_cache.cache.bypasses = 0
+    backtester = Backtester(bars, symbol='SYN')
+    metrics, folds = backtester.walk_forward(registry.get('test.py'), 8_000, 4_000, n_trials=8, n_jobs=1, seed=1)
+    stats = indicator_cache.cache.stats()
+    # Folds share the full-series indicators, a window one fold computed is a lookup for the next
+    assert stats['hits'] > 0
+    assert stats['bypasses'] == 0
+    assert len(folds) == 3
+    assert len(backtester.oos_equity) == 3 * 4_000
@@ -8,71 +8,68 @@ app = marimo.App(width="medium")
 def _():
     import marimo as mo
     import polars as pl
+    import plotly.express as px
     from pyecharts.charts import Bar, Candlestick, Kline
     from pyecharts import options as opts
     from pyecharts.globals import CurrentConfig, NotebookType
     CurrentConfig.NOTEBOOK_TYPE = NotebookType.JUPYTER_LAB
-    import vectorbt as vbt
     import os
-    import pandas as pd
+    from backtest import PortfolioBacktester, pivot_prices
+    from datastore import MarketDataStore
 
-    df=pd.read_parquet(f'C:\\Users\\{os.getlogin()}\\OneDrive\\Python\\stockdata.parquet')
-    #df=df.set_index('epoch')
+    # Bars from the ingested store, see `python datastore.py`
+    store = MarketDataStore(os.environ.get('STORE_ROOT', 'data')).open()
+    df = pl.concat([store.get(s) for s in store.symbols()])
     return (
         Bar,
         Candlestick,
         CurrentConfig,
         Kline,
         NotebookType,
+        PortfolioBacktester,
         df,
         mo,
         opts,
         os,
-        pd,
+        pivot_prices,
         pl,
-        vbt,
+        px,
+        store,
     )
 
 
 @app.cell
-def _(df):
-    df1=df[['epoch','close','symbol']]
-    df1=df1.pivot_table(index='epoch',columns='symbol', values='close',aggfunc='last')
+def _(df, pivot_prices):
+    df1 = pivot_prices(df)
     return (df1,)
 
 
 @app.cell
-def _(df, df1, pd, rsi, talib, vbt):
-    #rsi=vbt.RSI.run(df1)
-    import talib as tl
-
-    def cust_ind(high,low,close,vol):
-        macd, sig, hist= tl.MACD(df,fastperiod=10,slowperiod=20,signalperiod=6)
-        slowk, slowd=tl.STOCH(high,low,close)
-        obv = talib.OBV(df['Close'], df['Volume'])
-        macd_cross = (macd > sig) & (macd.shift(1) <= sig.shift(1))
-        stoch_buy = (slowk < 20) & (slowd < 20)
+def _(PortfolioBacktester, df1, px):
+    import numpy as _np
 
+    # Equal-weight buy and hold with shared cash: weights are set on the first bar only, NaN rows keep them
+    pbt = PortfolioBacktester(df1, initial_capital=1000)
+    w1 = _np.full((len(df1), len(pbt.symbols)), _np.nan)
+    w1[0] = 1 / len(pbt.symbols)
+    metrics, portdf = pbt.apply_weights(w1, fractional=True)
+    fig1 = px.line(portdf.to_pandas(), x='date', y='equity', template='plotly_white')
+    fig1
+    return fig1, metrics, pbt, portdf, w1
 
-    ind=vbt.IndicatorFactory(class_name="Combination",short_name="comb",input_names=['high','low','close','volume'],param_names=['window'],
-            output_names='value').from_apply_func(cust_ind)
 
-    res=ind.run(df1)
-    w1 = pd.Series([0.20, 0.20, 0.20, 0.20, 0.20], index=df1.columns)
-    normdf = df1 / df1.iloc[0] * 100
-    portdf=(normdf* w1).sum(axis=1)
-    entries= rsi.rsi_crossed_below(30)
-    exits= rsi.rsi_crossed_above(70)
-
-    pf=vbt.Portfolio.from_orders(portdf,init_cash=1000,freq='1D')
-    pf.plot(template='plotly_white')
-    return cust_ind, entries, exits, ind, normdf, pf, portdf, res, tl, w1
+@app.cell
+def _(metrics):
+    metrics
+    return
 
 
 @app.cell
-def _(pf):
-    pf.stats(column=3).to_string()
-    return
+def _():
+    # The Yahoo Finance experiments below still use vectorbt
+    import pandas as pd
+    import vectorbt as vbt
+    return pd, vbt
 
 
 @app.cell